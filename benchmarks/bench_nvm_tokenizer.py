@@ -0,0 +1,62 @@
+"""Micro-benchmark of the NVM reply tokenizer.
+
+Compares naimco.msg_processing.tokenize_nvm with shlex.split on the NVM
+replies collected in api_sniffing/nvm_replies.txt.
+
+Run from the repository root with:  python -m benchmarks.bench_nvm_tokenizer
+"""
+
+import pathlib
+import shlex
+import timeit
+
+from naimco.msg_processing import tokenize_nvm
+
+REPLIES = pathlib.Path(__file__).parent.parent / "api_sniffing" / "nvm_replies.txt"
+
+
+def nvm_reply_lines(path=REPLIES):
+    """The '#NVM ...' reply lines in nvm_replies.txt"""
+    lines = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        start = line.find("#NVM")
+        if start >= 0:
+            lines.append(line[start:].rstrip())
+    return lines
+
+
+def main():
+    lines = nvm_reply_lines()
+    shlex_lines = []
+    for line in lines:
+        try:
+            expected = shlex.split(line)
+        except ValueError as e:
+            print(
+                f"shlex fails on {line!r}: {e}, tokenize_nvm gives {tokenize_nvm(line)}"
+            )
+            continue
+        shlex_lines.append(line)
+        if tokenize_nvm(line) != expected:
+            print(f"differs on {line!r}: {tokenize_nvm(line)} != {expected}")
+
+    def run_all(tokenize):
+        for line in shlex_lines:
+            tokenize(line)
+
+    number = 200
+    shlex_time = min(
+        timeit.repeat(lambda: run_all(shlex.split), number=number, repeat=5)
+    )
+    nvm_time = min(
+        timeit.repeat(lambda: run_all(tokenize_nvm), number=number, repeat=5)
+    )
+    count = len(shlex_lines) * number
+    print(f"{len(shlex_lines)} reply lines")
+    print(f"shlex.split   {shlex_time / count * 1e6:8.2f} us/line")
+    print(f"tokenize_nvm  {nvm_time / count * 1e6:8.2f} us/line")
+    print(f"speedup       {shlex_time / nvm_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Benchmark of the parse -> dispatch -> state pipeline.
+
+Measures each stage on realistic traffic from benchmarks.samples, or on a
+session recorded with naimco.fake_device.RecordingProxy:
+
+- MessageStreamProcessor.feed on the byte stream split into packets
+- tree_to_dict on parsed elements
+- NVMController.assemble_msgs and process_msg on NVM reply lines
+- gen_xml_command on typical commands
+- Controller.process end to end, from packets to NaimState
+
+For each it reports throughput, p50/p99 latency per call and the bytes
+allocated per call, peak and retained, as measured by tracemalloc. The
+results are saved as JSON, pass an earlier file with --compare to see the
+change.
+
+Run from the repository root with:  python -m benchmarks.bench_pipeline
+"""
+
+import argparse
+import datetime as dt
+import importlib.metadata
+import json
+import logging
+import pathlib
+import platform
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from naimco import NaimCo
+from naimco.controllers import Controller
+from naimco.msg_processing import (
+    MessageFramer,
+    MessageStreamProcessor,
+    gen_xml_command,
+    tree_to_dict,
+)
+
+from .samples import messages, nvm_lines, packets, session_packets
+
+RESULTS = pathlib.Path(__file__).parent / "results"
+
+COMMANDS = [
+    ("Ping", "1", None),
+    ("SetHeartbeatTimeout", "2", [{"item": {"name": "timeout", "int": "10"}}]),
+    (
+        "TunnelToHost",
+        "3",
+        [{"item": {"name": "data", "base64": "Kk5WTSBHRVRQUkVBTVAN\n"}}],
+    ),
+    (
+        "GetRows",
+        "4",
+        [
+            {"item": {"name": "list_handle", "int": "65"}},
+            {"item": {"name": "from", "int": "1"}},
+            {"item": {"name": "to", "int": "20"}},
+        ],
+    ),
+]
+
+
+def percentile(sorted_values, fraction):
+    return sorted_values[
+        min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    ]
+
+
+def measure(func, items, repeat=5, units=None):
+    """Time func(item) for every item
+
+    Parameters
+    ----------
+    units : int
+        Number of messages in `items`, when it differs from the number of
+        calls, e.g. for packets.
+    """
+    # warm up with a whole pass, packets must be fed in order
+    for item in items:
+        func(item)
+    perf = time.perf_counter_ns
+    timings = []
+    best = None
+    for _ in range(repeat):
+        start = perf()
+        for item in items:
+            t0 = perf()
+            func(item)
+            timings.append(perf() - t0)
+        total = perf() - start
+        best = total if best is None else min(best, total)
+    timings.sort()
+
+    tracemalloc.start()
+    peak = retained = 0
+    for item in items:
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func(item)
+        current, item_peak = tracemalloc.get_traced_memory()
+        peak += item_peak - before
+        retained += current - before
+    tracemalloc.stop()
+
+    calls = len(items)
+    return {
+        "calls": calls,
+        "per_second": (units or calls) / (best / 1e9),
+        "p50_us": percentile(timings, 0.50) / 1e3,
+        "p99_us": percentile(timings, 0.99) / 1e3,
+        "peak_bytes": peak / calls,
+        "retained_bytes": retained / calls,
+    }
+
+
+def run(device_packets, message_count):
+    """Run all the benchmarks, returns the results by benchmark name"""
+    results = {}
+    stream = b"".join(device_packets)
+
+    processor = MessageStreamProcessor()
+
+    def feed(packet):
+        processor.feed(packet)
+        list(processor.read_messages())
+
+    results["feed"] = measure(feed, device_packets, units=message_count)
+
+    framer = MessageFramer()
+    framer.feed(stream)
+    elements = [ET.fromstring(frame) for frame in framer.frames()]
+    results["tree_to_dict"] = measure(tree_to_dict, elements)
+
+    controller = Controller(NaimCo("127.0.0.1"))
+    lines = nvm_lines()
+    results["nvm.process_msg"] = measure(controller.nvm.process_msg, lines)
+    results["nvm.assemble_msgs"] = measure(
+        controller.nvm.assemble_msgs, [f"{line}\r\n" for line in lines]
+    )
+
+    results["gen_xml_command"] = measure(
+        lambda command: gen_xml_command(*command), COMMANDS
+    )
+
+    controller = Controller(NaimCo("127.0.0.1"))
+    pipeline = MessageStreamProcessor()
+
+    def process(packet):
+        pipeline.feed(packet)
+        for tag, data in pipeline.read_messages():
+            controller.process(tag, data)
+
+    results["end_to_end"] = measure(process, device_packets, units=message_count)
+    return results
+
+
+def report(results, baseline=None):
+    header = f"{'benchmark':<18} {'msg/s':>11} {'p50 us':>8} {'p99 us':>8}"
+    header += f" {'peak B':>8} {'kept B':>7}"
+    if baseline:
+        header += f" {'vs base':>8}"
+    print(header)
+    for name, result in results.items():
+        line = (
+            f"{name:<18} {result['per_second']:>11,.0f} {result['p50_us']:>8.2f}"
+            f" {result['p99_us']:>8.2f} {result['peak_bytes']:>8.0f}"
+            f" {result['retained_bytes']:>7.0f}"
+        )
+        if baseline and name in baseline:
+            line += f" {result['per_second'] / baseline[name]['per_second']:>7.2f}x"
+        print(line)
+
+
+def version():
+    try:
+        return importlib.metadata.version("naimco")
+    except importlib.metadata.PackageNotFoundError:
+        return "dev"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--session", help="Recorded session to use as traffic")
+    parser.add_argument(
+        "--messages", type=int, default=2000, help="Number of sample messages"
+    )
+    parser.add_argument("--output", help="Results file, default in results/")
+    parser.add_argument("--compare", help="Earlier results file to compare with")
+    args = parser.parse_args()
+    # unhandled messages in the samples log warnings, that is not what we measure
+    logging.basicConfig(level=logging.ERROR)
+
+    if args.session:
+        device_packets = session_packets(args.session)
+        counter = MessageStreamProcessor()
+        for packet in device_packets:
+            counter.feed(packet)
+        message_count = counter.pending_messages
+    else:
+        samples = messages(args.messages)
+        device_packets = packets("".join(samples).encode("utf-8"))
+        message_count = len(samples)
+
+    results = run(device_packets, message_count)
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+    report(results, baseline)
+
+    output = pathlib.Path(args.output or RESULTS / f"pipeline-{version()}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        json.dumps(
+            {
+                "version": version(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(),
+                "messages": message_count,
+                "results": results,
+            },
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+    print(f"Saved {output}")
+
+
+if __name__ == "__main__":
+    main()
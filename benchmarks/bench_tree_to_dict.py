@@ -0,0 +1,140 @@
+"""Micro-benchmark of tree_to_dict.
+
+Compares tree_to_dict in naimco.msg_processing with the original
+implementation, which serialized every array item with ET.tostring for a
+debug message, using the sample payloads from api_sniffing/sniffing.rst and
+a large synthetic GetRows reply.
+
+Run from the repository root with:  python -m benchmarks.bench_tree_to_dict
+"""
+
+import base64
+import logging
+import timeit
+import xml.etree.ElementTree as ET
+
+from naimco.msg_processing import tree_to_dict
+
+_LOG = logging.getLogger(__name__)
+
+
+def legacy_tree_to_dict(element):
+    """tree_to_dict as it was before the debug message was dropped."""
+    if (tag := element.tag) in ["reply", "event", "item", "error"]:
+        me = {}
+        val = None
+        for k, v in element.items():
+            match k:
+                case "name":
+                    name = v
+                case "id":
+                    me["id"] = v
+                case "int":
+                    val = int(v)
+                case "string":
+                    val = v
+                case _:
+                    raise NotImplementedError(f"Unknown attribute {k} in {tag}")
+        for child in element:
+            match child.tag:
+                case "name":
+                    name = child.text
+                case "string":
+                    val = child.text
+                case "map":
+                    val = {}
+                    for item in child:
+                        subtag, d = legacy_tree_to_dict(item)
+                        val.update(d)
+                case "array":
+                    val = []
+                    for item in child:
+                        if item.tag == "map":
+                            map = {}
+                            for it2 in item:
+                                _LOG.debug(f"item: {ET.tostring(it2)}")
+                                subtag, d = legacy_tree_to_dict(it2)
+                                map.update(d)
+                            val.append(map)
+                        else:
+                            subtag, d = legacy_tree_to_dict(item)
+                            val.append(d)
+                case "base64":
+                    val = base64.b64decode(child.text).decode("utf-8")
+                case _:
+                    if child.tag in ["id", "code", "description"]:
+                        me[child.tag] = child.text
+                    else:
+                        raise NotImplementedError(f"Unknown child {child.tag} in {tag}")
+        me[name] = val
+        return tag, me
+    raise NotImplementedError(f"Unknown element {element.tag}")
+
+
+SNIFFED = {
+    "reply": '<reply name="SetHeartbeatTimeout" id="2">\n</reply>',
+    "reply with map": """<reply name="GetPlaylistStats" id="9">
+        <map>
+            <item name="active_idx" int="0" />
+            <item name="count" int="0" />
+            <item name="in_use" int="0" />
+            <item name="max_size" int="500" />
+        </map>
+    </reply>""",
+    "event": """<event name="GetViewState">
+        <map>
+            <item name="state" string="play" />
+        </map>
+    </event>""",
+    "error": """<error>
+        <name>GetNowPlaying</name>
+        <id>12</id>
+        <code>1</code>
+        <description>Not playing</description>
+    </error>""",
+    "tunnel": """<event name="TunnelFromHost">
+        <map>
+            <item name="data">
+                <base64>I05WTSBFUlJPUjogWzExXSA=</base64>
+            </item>
+        </map>
+    </event>""",
+}
+
+
+def get_rows_reply(rows):
+    """A GetRows reply with `rows` rows in the shape of the sniffed replies."""
+    items = "".join(
+        "<map>"
+        f'<item name="name" string="Track {i}" />'
+        f'<item name="index" int="{i}" />'
+        '<item name="type" string="track" />'
+        "</map>"
+        for i in range(1, rows + 1)
+    )
+    return f'<reply name="GetRows" id="7"><array>{items}</array></reply>'
+
+
+def best_of(func, element, number):
+    """Best time of 5 runs of `number` calls to `func(element)`."""
+    return min(timeit.repeat(lambda: func(element), number=number, repeat=5))
+
+
+def main():
+    payloads = dict(SNIFFED)
+    payloads["GetRows 500 rows"] = get_rows_reply(500)
+    print(f"{'payload':<20} {'legacy us':>10} {'current us':>10} {'speedup':>8}")
+    for label, xml in payloads.items():
+        element = ET.fromstring(xml)
+        assert tree_to_dict(element) == legacy_tree_to_dict(element), label
+        number = 200 if "GetRows" in label else 20000
+        legacy = best_of(legacy_tree_to_dict, element, number)
+        current = best_of(tree_to_dict, element, number)
+        print(
+            f"{label:<20} {legacy / number * 1e6:>10.2f} {current / number * 1e6:>10.2f}"
+            f" {legacy / current:>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Realistic Mu-so traffic shared by the benchmarks.
+
+The messages are the sniffed samples from api_sniffing/sniffing.rst and the
+canned NVM replies of the fake device, mixed in the proportions seen on a
+playing device, where GetNowPlayingTime events arrive every second. A
+session recorded with naimco.fake_device.RecordingProxy can be used instead.
+"""
+
+import base64
+
+from naimco.fake_device import DEFAULT_NVM_REPLIES, load_session
+
+from .bench_tree_to_dict import SNIFFED, get_rows_reply
+
+#: Typical TCP payload size of a packet from the device
+PACKET_SIZE = 1448
+
+
+def tunnel_event(lines):
+    """TunnelFromHost event carrying NVM reply lines"""
+    data = "".join(f"{line}\r\n" for line in lines).encode("utf-8")
+    encoded = base64.b64encode(data).decode("ascii")
+    return (
+        '<event name="TunnelFromHost"><map><item name="data">'
+        f"<base64>{encoded}</base64></item></map></event>"
+    )
+
+
+def now_playing_time_event(seconds):
+    return (
+        '<event name="GetNowPlayingTime"><map>'
+        f'<item name="play_time" int="{seconds}" />'
+        "</map></event>"
+    )
+
+
+NOW_PLAYING_EVENT = (
+    '<event name="GetNowPlaying"><map>'
+    '<item name="title" string="Morgunútvarpið" />'
+    '<item name="source" string="iradio" />'
+    '<item name="metadata"><map>'
+    '<item name="artist" string="Rás 2" />'
+    '<item name="album" string="RÚV" />'
+    "</map></item>"
+    "</map></event>"
+)
+
+
+def nvm_lines():
+    """NVM reply lines the controller has handlers for"""
+    return [line for lines in DEFAULT_NVM_REPLIES.values() for line in lines]
+
+
+def messages(count=2000):
+    """`count` device messages as strings, in a realistic mix"""
+    nvm = [tunnel_event([line]) for line in nvm_lines()]
+    mix = [*SNIFFED.values(), NOW_PLAYING_EVENT, get_rows_reply(20), *nvm]
+    result = []
+    seconds = 0
+    while len(result) < count:
+        for message in mix:
+            # a play time event between each of the other messages
+            seconds += 1
+            result.append(now_playing_time_event(seconds))
+            result.append(message)
+    return result[:count]
+
+
+def packets(stream: bytes, size=PACKET_SIZE):
+    """Split a byte stream into packets of `size` bytes"""
+    return [stream[i : i + size] for i in range(0, len(stream), size)]
+
+
+def session_packets(path):
+    """The packets sent by the device in a recorded session"""
+    return [data for _, sender, data in load_session(path) if sender == "device"]
@@ -1,5 +1,6 @@
 import logging
 from .core import NaimCo, NaimState
+from .fleet import NaimFleet
 
 # http://docs.python.org/2/howto/logging.html#library-config
 # Avoids spurious error messages if no logger is configured by the user
@@ -10,4 +11,4 @@ __version__ = "0.0.1"
 __author__ = "Yngvi Þór Sigurjónsson"
 __email__ = "blitzkopf@gmail.com"
 
-__all__ = ["NaimCo", "NaimState"]
+__all__ = ["NaimCo", "NaimFleet", "NaimState"]
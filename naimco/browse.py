@@ -0,0 +1,144 @@
+"""Paging through the browse lists of a Mu-so
+
+The device shows one list at a time, e.g. the tracks on a UPnP server or a
+USB stick. GetActiveList returns the handle and the number of rows of that
+list and GetRows returns a range of its rows. Fetching all rows at once is
+one huge reply for a large library, iter_rows pages through the list in
+windows instead, fetching the next window while the current one is used,
+and keeps recently used windows in a RowCache.
+"""
+
+import logging
+import asyncio
+import collections
+
+_LOG = logging.getLogger(__name__)
+
+#: Rows fetched with one GetRows command
+PAGE_SIZE = 50
+#: Rows a RowCache holds before evicting the least recently used windows
+CACHE_ROWS = 2000
+
+
+class BrowseError(Exception):
+    """Error reply to GetActiveList or GetRows"""
+
+
+def rows_payload(list_handle, first, last):
+    """Payload of a GetRows command for rows `first` to `last`, inclusive"""
+    return [
+        {"item": {"name": "list_handle", "int": str(list_handle)}},
+        {"item": {"name": "from", "int": str(first)}},
+        {"item": {"name": "to", "int": str(last)}},
+    ]
+
+
+class RowCache:
+    """Windows of rows of browse lists, least recently used evicted first
+
+    Windows are keyed by list handle and row range. Once more than
+    `max_rows` rows are held, of all lists together, the least recently
+    used windows are dropped.
+    """
+
+    def __init__(self, max_rows=CACHE_ROWS):
+        self.max_rows = max_rows
+        #: Number of rows held
+        self.rows = 0
+        self._windows = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._windows)
+
+    def get(self, list_handle, first, last) -> list | None:
+        """The rows `first` to `last` of a list, None if not cached"""
+        key = (list_handle, first, last)
+        rows = self._windows.get(key)
+        if rows is not None:
+            self._windows.move_to_end(key)
+        return rows
+
+    def put(self, list_handle, first, last, rows):
+        key = (list_handle, first, last)
+        old = self._windows.pop(key, None)
+        if old is not None:
+            self.rows -= len(old)
+        self._windows[key] = rows
+        self.rows += len(rows)
+        # the newest window is kept even when it is larger than max_rows
+        while self.rows > self.max_rows and len(self._windows) > 1:
+            _, evicted = self._windows.popitem(last=False)
+            self.rows -= len(evicted)
+
+    def invalidate(self, list_handle=None):
+        """Drop the windows of a list, or of all lists with None"""
+        if list_handle is None:
+            self._windows.clear()
+            self.rows = 0
+            return
+        for key in [key for key in self._windows if key[0] == list_handle]:
+            self.rows -= len(self._windows.pop(key))
+
+
+async def iter_rows(
+    controller, list_handle=None, count=None, start=1, page_size=PAGE_SIZE
+):
+    """Iterate over the rows of a browse list, one window at a time
+
+    While the rows of one window are consumed the next window is fetched,
+    at most two windows are held besides the ones in the row cache of the
+    controller.
+
+    Parameters
+    ----------
+    controller : Controller
+        Controller of the device.
+    list_handle : int
+        Handle of the list, defaults to the active list.
+    count : int
+        Number of rows in the list. Defaults to the count of the active
+        list, when `list_handle` is given without it rows are fetched until
+        a window comes back short.
+    start : int
+        First row, rows are numbered from 1.
+    page_size : int
+        Rows fetched with each GetRows command.
+
+    Yields
+    ------
+    dict
+        One row, as decoded from the GetRows reply.
+    """
+    if list_handle is None:
+        active = await controller.get_active_list()
+        list_handle = active["list_handle"]
+        count = active["count"]
+    first = start
+    pending = None
+    try:
+        while count is None or first <= count:
+            last = first + page_size - 1
+            if count is not None:
+                last = min(last, count)
+            window = pending or asyncio.ensure_future(
+                controller.get_rows(list_handle, first, last)
+            )
+            pending = None
+            rows = await window
+            complete = len(rows) == last - first + 1
+            if complete and (count is None or last < count):
+                following = last + 1 + page_size - 1
+                if count is not None:
+                    following = min(following, count)
+                pending = asyncio.ensure_future(
+                    controller.get_rows(list_handle, last + 1, following)
+                )
+            for row in rows:
+                yield row
+            if not complete:
+                break
+            first = last + 1
+    finally:
+        if pending is not None:
+            # the consumer stopped early, drop the window fetched ahead
+            pending.cancel()
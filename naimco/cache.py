@@ -0,0 +1,112 @@
+import logging
+import json
+import os
+import tempfile
+import threading
+
+from .records import InputEntry, PresetEntry
+
+_LOG = logging.getLogger(__name__)
+
+#: Version of the file format, files with another version are ignored
+CACHE_VERSION = 1
+
+# one lock per cache file, stores run in threads with asyncio.to_thread
+_file_locks: dict[str, threading.Lock] = {}
+_file_locks_lock = threading.Lock()
+
+
+def _file_lock(path) -> threading.Lock:
+    with _file_locks_lock:
+        return _file_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def static_data(state) -> dict:
+    """The static fields of a NaimState in the form stored in the cache"""
+    return {
+        "serialnum": state.serialnum,
+        "product": state.product,
+        "roomname": state.roomname,
+        "inputblk": [[index, *entry] for index, entry in state.inputblk.items()],
+        "presetblk": [[index, *entry] for index, entry in state.presetblk.items()],
+        "bridge_co_app_versions": state.bridge_co_app_versions,
+    }
+
+
+def load_static_data(state, data: dict):
+    """Set the static fields of a NaimState from a cache entry"""
+    state.serialnum = data["serialnum"]
+    state.product = data["product"]
+    state.roomname = data["roomname"]
+    for index, *entry in data["inputblk"]:
+        state.set_inputblk_entry(index, InputEntry(*entry))
+    state.finish_block("inputblk", {entry[0] for entry in data["inputblk"]})
+    for index, *entry in data["presetblk"]:
+        state.set_presetblk_entry(index, PresetEntry(*entry))
+    state.finish_block("presetblk", {entry[0] for entry in data["presetblk"]})
+    state.set_bridge_co_app_versions(data["bridge_co_app_versions"])
+
+
+class StateCache:
+    """Static device data stored in a JSON file
+
+    Holds one entry per device, keyed by IP address, with the serial number
+    of the device so a different device that got the same address is
+    detected. The file is small and written atomically, many devices can
+    share one file. Stores to the same file are serialized within a process,
+    the file must not be shared between processes.
+    """
+
+    def __init__(self, path):
+        """Create a cache
+
+        Parameters
+        ----------
+        path : str | os.PathLike
+            The cache file, created on the first store.
+        """
+        self.path = os.fspath(path)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            _LOG.warning(f"Ignoring unreadable cache {self.path}: {e}")
+            return {}
+        if not isinstance(data, dict) or data.get("version") != CACHE_VERSION:
+            return {}
+        return data.get("devices", {})
+
+    def load(self, ip_address) -> dict | None:
+        """The cache entry of a device, None if it is not cached"""
+        return self._read().get(ip_address)
+
+    def store(self, ip_address, entry: dict | None):
+        """Store or, with None, remove the cache entry of a device"""
+        with _file_lock(self.path):
+            self._store(ip_address, entry)
+
+    def _store(self, ip_address, entry):
+        devices = self._read()
+        if entry is None:
+            if devices.pop(ip_address, None) is None:
+                return
+        else:
+            devices[ip_address] = entry
+        directory = os.path.dirname(self.path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".naimco-cache")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(
+                    {"version": CACHE_VERSION, "devices": devices},
+                    file,
+                    separators=(",", ":"),
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
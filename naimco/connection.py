@@ -1,22 +1,64 @@
 import logging
 import asyncio
+import socket
 
 NAIM_SOCKET_API_PORT = 15555
 _LOG = logging.getLogger(__name__)
 
 
+def _retrieve_exception(future):
+    if not future.cancelled():
+        future.exception()
+
+
+def set_tcp_keepalive(sock, idle, interval, count):
+    """Turn on TCP keepalive probes on a socket"""
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    for option, value in (
+        ("TCP_KEEPIDLE", idle),
+        ("TCP_KEEPINTVL", interval),
+        ("TCP_KEEPCNT", count),
+    ):
+        if hasattr(socket, option):
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+
+
 class Connection:
     """Class that takes care of actual connection to device.
 
     Creates a asyncio socket connection to the Mu-so device.
+
+    Outgoing messages are queued and written in batches, messages sent
+    within `max_latency` seconds of each other, or in the same event loop
+    iteration when it is 0, are written with one writelines call and one
+    drain. A batch is written at once when it reaches `max_batch` messages.
     """
 
-    def __init__(self, reader, writer):
+    def __init__(self, reader, writer, max_latency=0.0, max_batch=64):
         self.reader = reader
         self.writer = writer
+        self.max_latency = max_latency
+        self.max_batch = max_batch
+        self._queue = []
+        self._flush_waiter = None
+        self._flush_handle = None
+        self._drain_tasks = set()
+        #: Counters for the outgoing batches
+        self.bytes_sent = 0
+        self.frames_sent = 0
+        self.flushes = 0
+        self.last_flush_bytes = 0
+        self.last_flush_frames = 0
 
     @classmethod
-    async def create_connection(cls, ip_address, socket_api_port=NAIM_SOCKET_API_PORT):
+    async def create_connection(
+        cls,
+        ip_address,
+        socket_api_port=NAIM_SOCKET_API_PORT,
+        max_latency=0.0,
+        max_batch=64,
+        tcp_keepalive=None,
+    ):
         """Make the connection
 
         Parameters
@@ -25,6 +67,15 @@ class Connection:
             IP-address of the Mu-so speaker.
         socket_api_port : int
             TCP port for communicating with Mu-so.
+        max_latency : float
+            Seconds an outgoing message may wait for others to batch with.
+        max_batch : int
+            Maximum number of messages written in one batch.
+        tcp_keepalive : tuple[int, int, int]
+            Turn on TCP keepalive with (idle, interval, count), seconds idle
+            before the first probe, seconds between probes and number of
+            unanswered probes before the connection is dropped. Options the
+            platform does not have are skipped.
 
         Returns
         -------
@@ -34,7 +85,9 @@ class Connection:
         _LOG.debug("Connecting to  Naim Mu-So on ip: %s", ip_address)
 
         reader, writer = await asyncio.open_connection(ip_address, socket_api_port)
-        conn = cls(reader, writer)
+        if tcp_keepalive:
+            set_tcp_keepalive(writer.get_extra_info("socket"), *tcp_keepalive)
+        conn = cls(reader, writer, max_latency, max_batch)
         return conn
 
         # _LOG.debug("Created NaimCo instance for ip: %s", ip_address)
@@ -42,16 +95,16 @@ class Connection:
     async def receive(self):
         """Receive one packet of data from Mu-so device.
 
+        The data is returned undecoded, a packet can end in the middle of a
+        multibyte UTF-8 character so decoding is left to the message framer.
+
         Returns
         -------
-        str
-            Received data as a UTF-8 string.
+        bytes
+            Received data.
         """
         if not self.reader.at_eof():
-            data = await self.reader.read(2000)
-            # FIXME: I guess it is possible that the incoming packets get split in
-            # such a way that a multibyte char gets split.
-            return data.decode()
+            return await self.reader.read(2000)
         else:
             # What just happened? TODO:deal with connection failures and dropped connections
             # for now just throw exception
@@ -60,13 +113,93 @@ class Connection:
         # await self.reader.close()
 
     async def send(self, message):
-        _LOG.debug(f"Send: {message!r}")
-        self.writer.write(message.encode())
-        await self.writer.drain()
+        """Send a message to the Mu-so device.
+
+        Returns when the batch holding the message has been written and
+        drained.
+
+        Parameters
+        ----------
+        message : bytes | str
+            Encoded message, strings are encoded as UTF-8.
+        """
+        await asyncio.shield(self.write(message))
+
+    def write(self, message):
+        """Queue a message for the next batch.
+
+        Parameters
+        ----------
+        message : bytes | str
+            Encoded message, strings are encoded as UTF-8.
+
+        Returns
+        -------
+        asyncio.Future
+            Resolves when the batch has been written and drained.
+        """
+        _LOG.debug("Send: %r", message)
+        if isinstance(message, str):
+            message = message.encode()
+        self._queue.append(message)
+        waiter = self._flush_waiter
+        if waiter is None:
+            loop = asyncio.get_running_loop()
+            waiter = self._flush_waiter = loop.create_future()
+            waiter.add_done_callback(_retrieve_exception)
+            if self.max_latency:
+                self._flush_handle = loop.call_later(self.max_latency, self.flush)
+            else:
+                self._flush_handle = loop.call_soon(self.flush)
+        if len(self._queue) >= self.max_batch:
+            self.flush()
+        return waiter
+
+    def flush(self):
+        """Write the queued messages now"""
+        if self._flush_handle:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        waiter, self._flush_waiter = self._flush_waiter, None
+        queue, self._queue = self._queue, []
+        if not queue:
+            return
+        self.last_flush_frames = len(queue)
+        self.last_flush_bytes = sum(len(message) for message in queue)
+        self.frames_sent += self.last_flush_frames
+        self.bytes_sent += self.last_flush_bytes
+        self.flushes += 1
+        try:
+            self.writer.writelines(queue)
+        except Exception as e:
+            waiter.set_exception(e)
+            return
+        task = asyncio.create_task(self._drain(waiter))
+        self._drain_tasks.add(task)
+        task.add_done_callback(self._drain_tasks.discard)
+
+    async def _drain(self, waiter):
+        try:
+            await self.writer.drain()
+        except Exception as e:
+            if not waiter.done():
+                waiter.set_exception(e)
+        else:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def abort(self):
+        """Drop the connection at once, without flushing
+
+        Used when the device has stopped answering, the reader then reaches
+        EOF and the connection runner fails.
+        """
+        self.writer.transport.abort()
 
     async def close(self):
         """Close the connection
 
         Closing the writer causes the whole connection to close
         """
+        self.flush()
         self.writer.close()
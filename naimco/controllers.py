@@ -1,17 +1,99 @@
 import logging
 import base64
-import shlex
+import functools
 import time
 import asyncio
 import re
+from typing import NamedTuple
 
+from .browse import PAGE_SIZE, BrowseError, RowCache, iter_rows, rows_payload
 from .connection import Connection
-from .msg_processing import MessageStreamProcessor, gen_xml_command
+from .msg_processing import MessageStreamProcessor, gen_xml_command, tokenize_nvm
+from .trace import NVM_RECEIVED, NVM_SENT, RECEIVED, SENT
+from .scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_HIGH,
+    PRIORITY_USER,
+    CommandScheduler,
+)
+from .records import (
+    BriefNowPlaying,
+    InputEntry,
+    PreampState,
+    PresetEntry,
+    StandbyStatus,
+    ViewState,
+)
 
 _LOG = logging.getLogger(__name__)
 
 
-class Controller:
+def _retrieve_exception(future):
+    """Mark the exception of a future as retrieved.
+
+    Reply futures are often not awaited by anyone, this avoids asyncio
+    logging "exception was never retrieved" when they time out.
+    """
+    if not future.cancelled():
+        future.exception()
+
+
+def handles(*names):
+    """Decorator registering a method as the handler of messages called `names`
+
+    The names are XML reply/event names for Controller, e.g. "GetNowPlayingTime",
+    and NVM reply names for NVMController, e.g. "VOL+" or "ERROR:".
+    """
+
+    def decorator(func):
+        func._handles = names
+        return func
+
+    return decorator
+
+
+class HandlerRegistry:
+    """Base class for classes that dispatch messages to handlers by name
+
+    The handlers of each class are collected into its `handlers` dict once,
+    when the class is created, from the methods decorated with @handles and
+    the handlers of its base classes.
+    """
+
+    handlers: dict = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        handlers = {}
+        for base in reversed(cls.__mro__[1:]):
+            handlers.update(base.__dict__.get("handlers", {}))
+        for func in cls.__dict__.values():
+            for name in getattr(func, "_handles", ()):
+                handlers[name] = func
+        cls.handlers = handlers
+
+    @classmethod
+    def add_handler(cls, name, handler):
+        """Register a handler for messages called `name`
+
+        The handler is called like the handler methods of the class, as
+        handler(controller, val, id) for Controller and
+        handler(nvm_controller, tokens) for NVMController. It replaces any
+        existing handler for `name`. Subclasses created before the call don't
+        see the new handler.
+        """
+        cls.handlers[name] = handler
+
+
+class DataUpdateResult(NamedTuple):
+    """Outcome of Controller.request_data_update, lists of query names"""
+
+    received: list[str]
+    timed_out: list[str]
+    failed: list[str]
+
+
+class Controller(HandlerRegistry):
     """Controller communicates with the Mu-so device through the Connection class.
 
 
@@ -20,11 +102,38 @@ class Controller:
     It reads incoming replies from from the Connections and parses them and
     decides what to do with them.
 
-    For each expected reply/event name there is a class method that gets
-    called when we get a xml using that name
+    For each expected reply/event name there is a method registered with
+    @handles that gets called when we get a xml using that name
+
+    Each command gets a future that resolves with the reply to it, many
+    commands can be outstanding at once.
 
+    Commands go through a CommandScheduler that limits how many are sent per
+    second, sends user actions before background polling and drops queued
+    commands superseded by newer ones.
     """
 
+    #: Seconds to wait for a reply before its future fails with TimeoutError
+    REPLY_TIMEOUT = 10
+    #: Seconds request_data_update waits for all replies
+    DATA_UPDATE_TIMEOUT = 2
+    #: Commands per second sent to the device, None for no limit
+    COMMAND_RATE = 10
+    #: Commands that can be sent at once before COMMAND_RATE applies
+    COMMAND_BURST = 20
+    #: Seconds between superseding commands with the same key, e.g. SETRVOL
+    COMMAND_HOLD = 0.2
+    #: Seconds to wait for the reply to a keep alive Ping
+    PING_TIMEOUT = 3
+    #: Unanswered Pings in a row after which the connection is dropped
+    PING_MISS_LIMIT = 2
+    #: NVM queries for data that does not change while the device is running,
+    #: the input and preset blocks are fetched with NVMController.fetch_blocks
+    STATIC_QUERIES = ("GETSERIALNUM", "PRODUCT", "GETROOMNAME")
+    #: Seconds between full data updates that fetch the input and preset
+    #: blocks again, to pick up renamed presets
+    BLOCK_REFRESH_INTERVAL = 600
+
     def __init__(self, naimco):
         """Creates a Controller with NVMController"""
         self.naimco = naimco
@@ -32,20 +141,44 @@ class Controller:
         self.nvm = NVMController(self)
         self.timeout_interval = None
         self.last_send_time = None
+        self.last_receive_time = None
+        #: Round trip time of the last answered Ping in seconds
+        self.ping_rtt = None
+        self.missed_pings = 0
         self.connection = None
-        self.wait_events = {}
+        self.pending_replies: dict[str, asyncio.Future] = {}
+        self.metrics = naimco.metrics
+        self.trace = naimco.wire_trace
+        self.scheduler = CommandScheduler(
+            self.COMMAND_RATE, self.COMMAND_BURST, self.COMMAND_HOLD
+        )
+        #: Recently fetched windows of browse list rows
+        self.row_cache = RowCache()
 
     async def connect(self):
         """Opens the Connection to device"""
-        self.connection = await Connection.create_connection(self.naimco.ip_address)
+        self.connection = await Connection.create_connection(
+            self.naimco.ip_address,
+            self.naimco.port,
+            max_latency=self.naimco.send_max_latency,
+            max_batch=self.naimco.send_max_batch,
+            tcp_keepalive=self.naimco.tcp_keepalive,
+        )
 
-    async def initialize(self):
+    async def initialize(self, resume=False):
         """Initializes the controller
 
         Sends the initial commands to the Mu-so device to get the initial state.
+
+        Parameters
+        ----------
+        resume : bool
+            Reconnecting to a device we already know, the bridge co app
+            versions are only requested if they are missing.
         """
         await self.enable_v1_api()
-        await self.get_bridge_co_app_version()
+        if not (resume and self.naimco.state.bridge_co_app_versions):
+            await self.get_bridge_co_app_version()
         await self.nvm.send_command("SETUNSOLICITED ON")
 
     async def startup(self, timeout=None):
@@ -59,38 +192,138 @@ class Controller:
     async def shutdown(self):
         """Shuts down the controller
 
-        Stops the connection runner and closes the connection.
+        Stops the connection runner and closes the connection, if connect
+        got as far as opening one.
         """
-        await self.connection.close()
-
-    async def request_data_update(self):
-        await self.send_command("GetViewState")
-        await self.nvm.send_command("GETVIEWSTATE")
-        await self.nvm.send_command("GETPREAMP")
-        await self.nvm.send_command("GETBRIEFNP")
-        await self.nvm.send_command("GETSTANDBYSTATUS", wait_for_reply_timeout=0.5)
-        # Might need to be smarter about this if initial request failed partially
-        if len(self.naimco.state.inputblk) == 0:
-            await self.nvm.send_command("GETINPUTBLK", wait_for_reply_timeout=0.5)
-        if not self.naimco.state.product:
-            await self.nvm.send_command("PRODUCT")
-        if not self.naimco.state.serialnum:
-            await self.nvm.send_command("GETSERIALNUM")
-        if not self.naimco.state.roomname:
-            await self.nvm.send_command("GETROOMNAME", wait_for_reply_timeout=0.5)
-        if len(self.naimco.state.presetblk) == 0:
-            await self.nvm.send_command("GETTOTALPRESETS", wait_for_reply_timeout=0.5)
-        await self.nvm.send_command("GETTEMP")
-        await self.nvm.send_command("GETPSU", wait_for_reply_timeout=0.5)
-        if not self.naimco.state.illum:
-            await self.nvm.send_command("GETILLUM", wait_for_reply_timeout=0.5)
+        if self.nvm.block_fetch is not None:
+            self.nvm.block_fetch.cancel()
+        self.scheduler.close(ConnectionAbortedError("Controller shut down"))
+        futures = [request.future for request in self.nvm.pending]
+        futures.extend(self.pending_replies.values())
+        for future in futures:
+            if not future.done():
+                future.set_exception(ConnectionAbortedError("Controller shut down"))
+        self.pending_replies.clear()
+        if self.connection is not None:
+            await self.connection.close()
+
+    async def request_data_update(self, timeout=None, full=True):
+        """Refresh the device state
+
+        All queries are written to the connection at once and the replies are
+        awaited together. Static data, like the product and the inputs, is
+        only queried when it is missing from the state. The input and preset
+        blocks are also fetched again by full updates once they are older
+        than BLOCK_REFRESH_INTERVAL.
 
-        await self.send_command("GetNowPlaying")
+        Parameters
+        ----------
+        timeout : float
+            Seconds to wait for all replies, defaults to DATA_UPDATE_TIMEOUT.
+        full : bool
+            Also poll temperatures, voltages and illumination. Turned off when
+            resuming after a reconnect, to get the playback state as fast as
+            possible.
+
+        Returns
+        -------
+        DataUpdateResult
+            The queries that were answered, timed out or failed.
+        """
+        state = self.naimco.state
+        queries = ["GETVIEWSTATE", "GETPREAMP", "GETBRIEFNP", "GETSTANDBYSTATUS"]
+        if not state.product:
+            queries.append("PRODUCT")
+        if not state.serialnum:
+            queries.append("GETSERIALNUM")
+        if not state.roomname:
+            queries.append("GETROOMNAME")
+        blocks_due = not (state.has_block("inputblk") and state.has_block("presetblk"))
+        fetched_at = self.nvm.blocks_fetched_at
+        if full and fetched_at is not None:
+            age = time.monotonic() - fetched_at
+            blocks_due = blocks_due or age >= self.BLOCK_REFRESH_INTERVAL
+        if full:
+            queries.extend(("GETTEMP", "GETPSU"))
+            if not state.illum:
+                queries.append("GETILLUM")
+
+        queued = {
+            "GetViewState": self.submit("GetViewState", priority=PRIORITY_BACKGROUND)
+        }
+        for query in queries:
+            queued[query] = self.nvm.submit(query, PRIORITY_BACKGROUND)
+        futures = {name: command.reply for name, command in queued.items()}
+        if blocks_due:
+            futures["blocks"] = self.nvm.fetch_blocks()
+        futures["GetNowPlaying"] = self.submit(
+            "GetNowPlaying", priority=PRIORITY_BACKGROUND
+        ).reply
+        return await self._await_replies(futures, timeout)
+
+    async def refresh_static(self, timeout=None):
+        """Query the static data of the device again, even if it is known
+
+        Used to revalidate data loaded from a cache. The input and preset
+        blocks are skipped when they were fetched within
+        BLOCK_REFRESH_INTERVAL.
+
+        Parameters
+        ----------
+        timeout : float
+            Seconds to wait for all replies, defaults to DATA_UPDATE_TIMEOUT.
+
+        Returns
+        -------
+        DataUpdateResult
+            The queries that were answered, timed out or failed.
+        """
+        queued = {
+            "GetBridgeCoAppVersions": self.submit(
+                "GetBridgeCoAppVersions", priority=PRIORITY_BACKGROUND
+            )
+        }
+        for query in self.STATIC_QUERIES:
+            queued[query] = self.nvm.submit(query, PRIORITY_BACKGROUND)
+        futures = {name: command.reply for name, command in queued.items()}
+        state = self.naimco.state
+        fetched_at = self.nvm.blocks_fetched_at
+        if (
+            not (state.has_block("inputblk") and state.has_block("presetblk"))
+            or fetched_at is None
+            or time.monotonic() - fetched_at >= self.BLOCK_REFRESH_INTERVAL
+        ):
+            # a running fetch is shared, not started again
+            futures["blocks"] = self.nvm.fetch_blocks()
+        return await self._await_replies(futures, timeout)
+
+    async def _await_replies(self, futures, timeout):
+        """Wait for the replies to queries, futures keyed by query name"""
+        await asyncio.wait(
+            futures.values(), timeout=timeout or self.DATA_UPDATE_TIMEOUT
+        )
+        result = DataUpdateResult([], [], [])
+        for name, future in futures.items():
+            if not future.done():
+                result.timed_out.append(name)
+            elif future.cancelled():
+                result.failed.append(name)
+            elif isinstance(future.exception(), asyncio.TimeoutError):
+                result.timed_out.append(name)
+            elif future.exception():
+                result.failed.append(name)
+            else:
+                result.received.append(name)
+        if result.timed_out or result.failed:
+            _LOG.info(
+                f"Data update timed out: {result.timed_out} failed: {result.failed}"
+            )
+        return result
 
     async def connection_runner(self):
         """Coroutine that reads incoming stream from Connection
 
-        Reads the stream of strings from Connections and assembles them
+        Reads the stream of bytes from Connections and assembles them
         together and splits them into seperate XML snippets.
 
         The incoming stream of data is not split on event/reply boundaries
@@ -102,14 +335,19 @@ class Controller:
         """
 
         parser = MessageStreamProcessor()
-        # what happens if msgs are split on non char boundaries?
         while True:
             data = await self.connection.receive()
             if len(data) > 0:
-                _LOG.debug(f"Received: {data!r}")
+                self.last_receive_time = time.monotonic()
+                _LOG.debug("Received: %r", data)
+                if self.trace is not None:
+                    self.trace.record(RECEIVED, data)
                 parser.feed(data)
+                frames = 0
                 for tag, dict in parser.read_messages():
+                    frames += 1
                     self.process(tag, dict)
+                self.metrics.received(len(data), frames)
             else:
                 print(".", end="")
             await self.naimco._call_callback()
@@ -120,8 +358,10 @@ class Controller:
         The Mu-so device will terminate the TCP socket if it does not receive
         anything for a specific time.
         This coroutine sets the timout value in the Mu-so device and then
-        sets a timer to send a ping if we are within a second of reaching
-        the time limit.
+        sends a ping if we are within a second of reaching the time limit,
+        either since we sent something or since we received something. When
+        PING_MISS_LIMIT pings in a row go unanswered the connection is
+        dropped, so a dead device is noticed within seconds.
         Should be started as a seperate asyncio task.
 
         Parameters
@@ -131,18 +371,57 @@ class Controller:
         """
 
         await self.set_heartbeat_timout(timeout)
+        interval = timeout - 1
         while True:
             now = time.monotonic()
-            if now >= self.last_send_time + timeout - 1:
-                # await self.nvm.ping()
-                await self.send_command("Ping")
-            now = time.monotonic()
-            await asyncio.sleep(self.last_send_time + timeout - 1 - now)
+            last_activity = self.last_send_time
+            if self.last_receive_time is not None:
+                last_activity = min(last_activity, self.last_receive_time)
+            if now >= last_activity + interval:
+                await self.ping()
+                continue
+            await asyncio.sleep(last_activity + interval - now)
+
+    async def ping(self, timeout=None):
+        """Send a Ping and measure the round trip time
+
+        Parameters
+        ----------
+        timeout : float
+            Seconds to wait for the reply, defaults to PING_TIMEOUT.
+
+        Returns
+        -------
+        float | None
+            The round trip time in seconds, None if the reply did not arrive.
+
+        Raises
+        ------
+        ConnectionAbortedError
+            When PING_MISS_LIMIT pings in a row have gone unanswered, the
+            connection has then been dropped.
+        """
+        started = time.monotonic()
+        future = await self.send_command("Ping", priority=PRIORITY_HIGH)
+        try:
+            await asyncio.wait_for(future, timeout or self.PING_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.missed_pings += 1
+            _LOG.warning(f"No reply to Ping, {self.missed_pings} missed in a row")
+            if self.missed_pings >= self.PING_MISS_LIMIT:
+                self.connection.abort()
+                raise ConnectionAbortedError(
+                    f"{self.missed_pings} pings unanswered"
+                ) from None
+            return None
+        self.missed_pings = 0
+        self.ping_rtt = time.monotonic() - started
+        return self.ping_rtt
 
     def process(self, tag, data):
         """Process each incoming XML message
 
-        Calls a method with the name of the XML reply, prefixed with '_'.
+        Calls the handler registered for the name of the XML reply.
 
         TODO: deal with XML tag <error>
 
@@ -157,11 +436,11 @@ class Controller:
         id = None
         if tag == "error":
             id = data.get("id", None)
-            _LOG.debug(f"Error message {data}")
+            _LOG.debug("Error message %s", data)
             code = data.get("code", None)
             if code in ("1"):
                 # Ignonre these 1 NotPlaying
-                _LOG.debug(f"Error from Mu-so 1 {data}")
+                _LOG.debug("Error from Mu-so 1 %s", data)
             else:
                 _LOG.warning(f"Error from Mu-so {data}")
         else:
@@ -171,16 +450,23 @@ class Controller:
             for key, val in data.items():
                 if key == "id":
                     continue
-                method = getattr(self.__class__, "_" + key, None)
-                if method:
+                method = self.handlers.get(key)
+                if method is None:
+                    self.metrics.unhandled_message(key)
+                    _LOG.warning(f"Unhandled XML message {tag} {key} data:{data}")
+                elif self.metrics.enabled:
+                    started = time.perf_counter()
                     method(self, val, id)
+                    self.metrics.handled(key, time.perf_counter() - started)
                 else:
-                    _LOG.warning(f"Unhandled XML message {tag} {key} data:{data}")
+                    method(self, val, id)
         # is anyone waiting for an answer?
-        if id in self.wait_events:
-            _LOG.debug(f"Setting event for id {id}")
-            self.wait_events[id].set()
+        future = self.pending_replies.pop(id, None) if id else None
+        if future and not future.done():
+            _LOG.debug("Resolving reply for id %s", id)
+            future.set_result(data)
 
+    @handles("TunnelFromHost")
     def _TunnelFromHost(self, val, id):
         """Process data from NVM
 
@@ -195,13 +481,15 @@ class Controller:
         val : dict
             Contains the data from NVM in val['data']
         """
-        _LOG.debug(val["data"])
+        _LOG.debug("%s", val["data"])
         self.nvm.assemble_msgs(val["data"])
 
+    @handles("TunnelToHost")
     def _TunnelToHost(self, val, id):
         """As a reply this is just an empty reply, do nothing"""
         pass
 
+    @handles("GetViewState")
     def _GetViewState(self, val, id):
         """Respond to GetViewState replies/events
 
@@ -209,6 +497,7 @@ class Controller:
         """
         self.naimco.state.set_view_state(val["state"])
 
+    @handles("RequestAPIVersion")
     def _RequestAPIVersion(self, val, id):
         """Respond to RequestAPIVersion requests
 
@@ -216,6 +505,7 @@ class Controller:
         """
         None
 
+    @handles("GetBridgeCoAppVersions")
     def _GetBridgeCoAppVersions(self, val, id):
         """Respond to GetBridgeCoAppVersions replies
 
@@ -224,6 +514,7 @@ class Controller:
         """
         self.naimco.state.set_bridge_co_app_versions(val)
 
+    @handles("SetHeartbeatTimeout")
     def _SetHeartbeatTimeout(self, val, id):
         """Respond to RequestAPIVersion requests
 
@@ -231,6 +522,7 @@ class Controller:
         """
         None
 
+    @handles("GetNowPlaying")
     def _GetNowPlaying(self, val, id):
         """Respond to GetNowPlaying events/replies
 
@@ -238,30 +530,37 @@ class Controller:
         Mu-so will both send these as replies when commanded and as events when
         changing tracks.
         """
-        _LOG.debug(f"GetNowPlaying: {val}")
+        _LOG.debug("GetNowPlaying: %s", val)
         self.naimco.state.set_now_playing(val)
 
+    @handles("GetVolume")
     def _GetVolume(self, val, id):
         """Respond to GetVolume events/replies
 
         We don't ask for this we use *PREAMP instead but sometimes we get it anyway.
         Might as well keep track of it.
         """
-        _LOG.debug(f"GetVolume: {val}")
+        _LOG.debug("GetVolume: %s", val)
         self.naimco.state.volume = val["volume"]
 
+    @handles("GetActiveList")
     def _GetActiveList(self, val, id):
         """Respond to GetActiveList events/replies
 
 
         I have yet to figure out how this work, keeping track of it in the
-        device state for now.
+        device state for now. An event means the list changed, its cached
+        rows are dropped.
         """
+        if id is None and isinstance(val, dict):
+            self.row_cache.invalidate(val.get("list_handle"))
         self.naimco.state.set_active_list(val)
 
+    @handles("GetRows")
     def _GetRows(self, val, id):
         self.naimco.state.set_rows(val)
 
+    @handles("Ping")
     def _Ping(self, val, id):
         """Respond to Ping replies
 
@@ -270,6 +569,7 @@ class Controller:
         """
         pass
 
+    @handles("GetNowPlayingTime")
     def _GetNowPlayingTime(self, val, id):
         """Respond to GetNowPlaying time
 
@@ -284,35 +584,191 @@ class Controller:
         """
         self.naimco.state.set_now_playing_time(val["play_time"])
 
-    async def send_command(self, command, payload=None, wait_for_reply_timeout=None):
+    async def send_command(
+        self, command, payload=None, wait_for_reply_timeout=None, priority=None
+    ):
         """Encodes a command as XML and send to Mu-so
 
+        Returns when the command has been written, which can take a while
+        when the scheduler is holding commands back.
+
         Parameter
         ---------
         command : str
             The Naim Mu-so command to send
         payload : dict
             Parameters to send with the command
+        wait_for_reply_timeout : float
+            If set, wait up to this many seconds for the reply before returning.
+        priority : int
+            Scheduler priority, defaults to PRIORITY_USER.
+
+        Returns
+        -------
+        asyncio.Future
+            Resolves with the decoded reply dict, or the dict of the `<error>`
+            with its code and description. Fails with TimeoutError if no reply
+            arrives within REPLY_TIMEOUT seconds.
+        """
+        queued = self.submit(command, payload, priority=priority)
+        await asyncio.shield(queued.sent)
+        future = queued.reply
+        if wait_for_reply_timeout:
+            _LOG.debug("Waiting for reply to %s", command)
+            try:
+                await asyncio.wait_for(asyncio.shield(future), wait_for_reply_timeout)
+                _LOG.debug("Reply received to %s", command)
+            except asyncio.TimeoutError:
+                _LOG.warning(f"Timeout waiting for reply to {command}")
+        return future
+
+    def submit(self, command, payload=None, *, priority=None, key=None):
+        """Queue a command in the scheduler without waiting for it
 
+        Parameter
+        ---------
+        command : str
+            The Naim Mu-so command to send
+        payload : dict
+            Parameters to send with the command
+        priority : int
+            Scheduler priority, defaults to PRIORITY_USER.
+        key : str
+            A queued command with the same key is replaced by this one.
+
+        Returns
+        -------
+        QueuedCommand
+            With the `sent` future and the `reply` future of the command.
         """
+        return self.scheduler.submit(
+            functools.partial(self._write_command, command, payload),
+            PRIORITY_USER if priority is None else priority,
+            key,
+        )
+
+    def _write_command(self, command, payload):
+        """Write a command to the connection, called by the scheduler"""
+        cmd, future = self._encode_command(command, payload)
+        return self.connection.write(cmd), future
+
+    def _encode_command(self, command, payload):
+        """Encode a command and register a future for its reply"""
         self.cmd_id_seq += 1
         id = f"{self.cmd_id_seq}"
         cmd = gen_xml_command(command, id, payload)
         self.last_send_time = time.monotonic()
-        _LOG.debug(f"Sending {cmd}")
-        if wait_for_reply_timeout:
-            event = asyncio.Event()
-            self.wait_events[id] = event
-            await self.connection.send(cmd)
-            _LOG.debug(f"Waiting for reply {id}")
-            try:
-                await asyncio.wait_for(event.wait(), wait_for_reply_timeout)
-                _LOG.debug(f"Reply received {id}")
-            except asyncio.TimeoutError:
-                _LOG.warning(f"Timeout waiting for reply {id}")
-            del self.wait_events[id]
+        self.metrics.sent(len(cmd))
+        if self.trace is not None:
+            self.trace.record(SENT, cmd)
+        _LOG.debug("Sending %s", cmd)
+        return cmd, self._expect_reply(id, command)
+
+    async def request(self, command, payload=None, timeout=None):
+        """Send a command and wait for the reply.
+
+        Parameter
+        ---------
+        command : str
+            The Naim Mu-so command to send
+        payload : dict
+            Parameters to send with the command
+        timeout : float
+            Seconds to wait for the reply, defaults to REPLY_TIMEOUT.
+
+        Returns
+        -------
+        dict
+            The decoded reply, or the decoded `<error>`.
+
+        Raises
+        ------
+        TimeoutError
+            If the reply does not arrive in time.
+        """
+        future = await self.send_command(command, payload)
+        return await asyncio.wait_for(future, timeout or self.REPLY_TIMEOUT)
+
+    async def get_active_list(self, timeout=None):
+        """The handle and the number of rows of the active browse list
+
+        Returns
+        -------
+        dict
+            The GetActiveList reply, with "list_handle" and "count".
+
+        Raises
+        ------
+        BrowseError
+            If the device replies with an error.
+        """
+        reply = await self.request("GetActiveList", timeout=timeout)
+        active = reply.get("GetActiveList")
+        if not isinstance(active, dict):
+            raise BrowseError(f"GetActiveList failed: {reply}")
+        return active
+
+    async def get_rows(self, list_handle, first, last, timeout=None):
+        """Rows `first` to `last` of a browse list, from the row cache if there
+
+        Returns
+        -------
+        list[dict]
+            The rows, fewer than asked for at the end of the list.
+
+        Raises
+        ------
+        BrowseError
+            If the device replies with an error.
+        """
+        rows = self.row_cache.get(list_handle, first, last)
+        if rows is None:
+            reply = await self.request(
+                "GetRows", rows_payload(list_handle, first, last), timeout
+            )
+            rows = reply.get("GetRows")
+            if rows is None and "code" not in reply:
+                # an empty reply, past the end of the list
+                rows = []
+            if not isinstance(rows, list):
+                raise BrowseError(f"GetRows {first}-{last} failed: {reply}")
+            self.row_cache.put(list_handle, first, last, rows)
+        return rows
+
+    def browse(self, list_handle=None, count=None, start=1, page_size=PAGE_SIZE):
+        """Async iterator over the rows of a browse list, see iter_rows"""
+        return iter_rows(self, list_handle, count, start, page_size)
+
+    def _expect_reply(self, id, command=None):
+        """Register a future for the reply to command `id`"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        future.add_done_callback(_retrieve_exception)
+        expire = loop.call_later(self.REPLY_TIMEOUT, self._expire_reply, id)
+        future.add_done_callback(lambda _: expire.cancel())
+        if self.metrics.enabled:
+            self._observe_reply(future, command)
+        self.pending_replies[id] = future
+        return future
+
+    def _observe_reply(self, future, command):
+        """Report the reply latency or timeout of `future` to the metrics"""
+        future.add_done_callback(
+            functools.partial(self._reply_done, command, time.monotonic())
+        )
+
+    def _reply_done(self, command, sent, future):
+        if future.cancelled():
+            return
+        if isinstance(future.exception(), asyncio.TimeoutError):
+            self.metrics.timeout(command)
         else:
-            await self.connection.send(cmd)
+            self.metrics.reply(command, time.monotonic() - sent)
+
+    def _expire_reply(self, id):
+        future = self.pending_replies.pop(id, None)
+        if future and not future.done():
+            future.set_exception(asyncio.TimeoutError(f"No reply to command {id}"))
 
     async def enable_v1_api(self):
         """Enable version 1 of naim API
@@ -341,6 +797,10 @@ class Controller:
         )
 
 
+# Voltage readings from GETPSU, e.g. "1V2 reads 1209 mV"
+_VOLTAGE = re.compile(r"\d+V\d*")
+
+
 def na2none(value: str) -> str | None:
     """Handle NA string in value
 
@@ -348,30 +808,344 @@ def na2none(value: str) -> str | None:
     return None if value == "NA" else value
 
 
-class NVMController:
+def na2int(value: str) -> int | None:
+    """Handle NA string in numeric value
+
+    Returns None if value is NA, value as int otherwise"""
+    return None if value == "NA" else int(value)
+
+
+class NVMError(Exception):
+    """Error reply from NVM, e.g. ``#NVM ERROR: [5] Insufficient Parameters``"""
+
+    def __init__(self, command, tokens):
+        self.command = command
+        self.tokens = tokens
+        super().__init__(f"{command} failed: {' '.join(tokens)}")
+
+
+def _block_complete(end, tokens):
+    """Has the last line of a GETINPUTBLK/GETPRESETBLK reply arrived?
+
+    Lines are "<index> <total> ...", the block ends at the requested `end`
+    index or at the total number of entries.
+    """
+    index, total = int(tokens[0]), int(tokens[1])
+    return index >= (min(end, total) if end else total)
+
+
+def _unit_complete(unit, tokens):
+    """Is this the GETIC line for `unit`, the last line of GETTEMP/GETPSU?"""
+    return tokens[0] == unit
+
+
+class NVMRequest:
+    """An NVM command waiting for its reply lines"""
+
+    __slots__ = ("command", "reply_name", "future", "lines", "is_complete")
+
+    def __init__(self, command, reply_name, future, is_complete=None):
+        self.command = command
+        self.reply_name = reply_name
+        self.future = future
+        self.lines = []
+        self.is_complete = is_complete
+
+
+class NVMController(HandlerRegistry):
+    """Sends commands to and processes replies from NVM.
+
+    Each reply line is passed to the handler registered for its name with
+    @handles or add_handler.
+
+    Replies are matched to the request that caused them by the name of the
+    reply, requests with the same reply name are answered in the order they
+    were sent.
+    """
+
+    #: Reply names that differ from the command name
+    REPLY_NAMES = {
+        "GETPREAMP": "PREAMP",
+        "PING": "PONG",
+        "GETTEMP": "GETIC",
+        "GETPSU": "GETIC",
+    }
+    #: Commands where only the newest of those waiting to be sent matters
+    SUPERSEDING_COMMANDS = frozenset({"SETRVOL", "SETVOL", "SETBAL", "SETILLUM"})
+    #: Polling commands sent after user actions
+    BACKGROUND_COMMANDS = frozenset({"GETTEMP", "GETPSU"})
+
     def __init__(self, controller):
         self.controller = controller
         self.buffer = ""
         self.state = controller.naimco.state
+        self.pending: list[NVMRequest] = []
+        #: The running or last fetch of the input and preset blocks
+        self.block_fetch: asyncio.Future | None = None
+        #: time.monotonic() of the last complete fetch of the blocks
+        self.blocks_fetched_at = None
+
+    async def send_command(self, command, wait_for_reply_timeout=None, priority=None):
+        """Send a command to NVM
+
+        Parameter
+        ---------
+        command : str
+            The NVM command without the *NVM prefix, e.g. "GETVOL"
+        wait_for_reply_timeout : float
+            If set, wait up to this many seconds for the NVM reply before
+            returning.
+        priority : int
+            Scheduler priority, see submit.
+
+        Returns
+        -------
+        asyncio.Future
+            Resolves with the tokens of the reply line, or a list of token
+            lists for multi-line replies (GETINPUTBLK, GETPRESETBLK, GETTEMP).
+            Fails with NVMError on an error reply and TimeoutError if no reply
+            arrives within Controller.REPLY_TIMEOUT seconds.
+        """
+        queued = self.submit(command, priority)
+        await asyncio.shield(queued.sent)
+        future = queued.reply
+        if wait_for_reply_timeout:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), wait_for_reply_timeout)
+            except asyncio.TimeoutError:
+                _LOG.warning(f"Timeout waiting for NVM reply to {command}")
+            except NVMError as e:
+                _LOG.warning(f"NVM error reply: {e}")
+        return future
 
-    async def send_command(self, command, wait_for_reply_timeout=None):
+    def submit(self, command, priority=None):
+        """Queue a command to NVM in the controller's scheduler
+
+        A waiting command in SUPERSEDING_COMMANDS is replaced by a newer one
+        with the same name, both callers get the reply to the newer one.
+
+        Parameter
+        ---------
+        command : str
+            The NVM command without the *NVM prefix, e.g. "SETRVOL 20"
+        priority : int
+            Scheduler priority, defaults to PRIORITY_BACKGROUND for
+            BACKGROUND_COMMANDS and PRIORITY_USER for the rest.
+
+        Returns
+        -------
+        QueuedCommand
+            With the `sent` future and the NVM `reply` future of the command.
+        """
+        name = command.split(maxsplit=1)[0]
+        if priority is None:
+            if name in self.BACKGROUND_COMMANDS:
+                priority = PRIORITY_BACKGROUND
+            else:
+                priority = PRIORITY_USER
+        key = f"NVM {name}" if name in self.SUPERSEDING_COMMANDS else None
+        return self.controller.scheduler.submit(
+            functools.partial(self._write_command, command), priority, key
+        )
+
+    def fetch_blocks(self, priority=PRIORITY_BACKGROUND):
+        """Fetch the input and preset blocks, unless a fetch is running
+
+        The entries are stored in the state as the reply lines arrive. When
+        a block is complete the entries the device no longer reports are
+        dropped, and the block only counts as changed when its content hash
+        differs from the last fetch, see NaimState.finish_block.
+
+        Parameters
+        ----------
+        priority : int
+            Scheduler priority of the commands.
+
+        Returns
+        -------
+        asyncio.Future
+            Resolves with the names of the blocks that changed, "inputblk"
+            and "presetblk". Errors are also logged, nobody has to await it.
+        """
+        if self.block_fetch is None or self.block_fetch.done():
+            # submitted here so they are queued before the caller's next command
+            inputs = self.submit("GETINPUTBLK", priority)
+            total = self.submit("GETTOTALPRESETS", priority)
+            self.block_fetch = asyncio.ensure_future(
+                self._fetch_blocks(inputs, total, priority)
+            )
+            self.block_fetch.add_done_callback(self._block_fetch_done)
+        return self.block_fetch
+
+    async def _fetch_blocks(self, inputs, total, priority):
+        changed = []
+        lines = await inputs.reply
+        if self.state.finish_block("inputblk", {int(tokens[0]) for tokens in lines}):
+            changed.append("inputblk")
+        presets = int((await total.reply)[0])
+        lines = []
+        if presets:
+            lines = await self.submit(f"GETPRESETBLK 1 {presets}", priority).reply
+        if self.state.finish_block("presetblk", {int(tokens[0]) for tokens in lines}):
+            changed.append("presetblk")
+        self.blocks_fetched_at = time.monotonic()
+        return changed
+
+    def _block_fetch_done(self, future):
+        if future.cancelled():
+            return
+        if exc := future.exception():
+            _LOG.warning("Fetching the input and preset blocks failed: %r", exc)
+        else:
+            _LOG.debug(
+                "Fetched the input and preset blocks, changed %s", future.result()
+            )
+
+    def _write_command(self, command):
+        """Register the reply and write the command, called by the scheduler"""
+        future = self._expect_reply(command)
+        if self.controller.trace is not None:
+            self.controller.trace.record(NVM_SENT, command)
+        waiter, _ = self.controller._write_command(
+            "TunnelToHost", self._tunnel_payload(command)
+        )
+        return waiter, future
+
+    def _tunnel_payload(self, command):
+        """Payload of the TunnelToHost command carrying an NVM command"""
         cmd = f"*NVM {command}"
-        _LOG.debug(f"Sending {cmd}")
-        await self.controller.send_command(
-            "TunnelToHost",
-            [
-                {
-                    "item": {
-                        "name": "data",
-                        "base64": base64.b64encode(bytes(cmd + "\r", "utf-8")).decode(
-                            "utf-8"
-                        )
-                        + "\n",
-                    }
+        _LOG.debug("Sending %s", cmd)
+        return [
+            {
+                "item": {
+                    "name": "data",
+                    "base64": base64.b64encode(bytes(cmd + "\r", "utf-8")).decode(
+                        "utf-8"
+                    )
+                    + "\n",
                 }
-            ],
-            wait_for_reply_timeout=wait_for_reply_timeout,
+            }
+        ]
+
+    async def request(self, command, timeout=None):
+        """Send a command to NVM and wait for the reply
+
+        Returns
+        -------
+        list
+            The reply tokens, see send_command.
+
+        Raises
+        ------
+        NVMError
+            If NVM replies with an error.
+        TimeoutError
+            If the reply does not arrive in time.
+        """
+        future = await self.send_command(command)
+        return await asyncio.wait_for(future, timeout or self.controller.REPLY_TIMEOUT)
+
+    def _expect_reply(self, command):
+        """Register a request for the reply to `command`"""
+        args = command.split()
+        name = args[0]
+        is_complete = None
+        if name == "GETINPUTBLK":
+            is_complete = functools.partial(_block_complete, None)
+        elif name == "GETPRESETBLK":
+            end = int(args[2]) if len(args) > 2 else None
+            is_complete = functools.partial(_block_complete, end)
+        elif name == "GETTEMP":
+            is_complete = functools.partial(_unit_complete, "MAIN")
+        elif name == "GETPSU":
+            is_complete = functools.partial(_unit_complete, "BO_DETECT")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        request = NVMRequest(
+            command, self.REPLY_NAMES.get(name, name), future, is_complete
+        )
+        self.pending.append(request)
+        expire = loop.call_later(
+            self.controller.REPLY_TIMEOUT, self._expire_reply, request
         )
+        future.add_done_callback(_retrieve_exception)
+        future.add_done_callback(lambda _: self._discard(request, expire))
+        if self.controller.metrics.enabled:
+            self.controller._observe_reply(future, f"NVM {name}")
+        return future
+
+    def _discard(self, request, expire):
+        expire.cancel()
+        if request in self.pending:
+            self.pending.remove(request)
+
+    def _expire_reply(self, request):
+        if not request.future.done():
+            request.future.set_exception(
+                asyncio.TimeoutError(f"No NVM reply to {request.command}")
+            )
+
+    def _resolve(self, name, tokens):
+        """Pass a reply line to the oldest request waiting for it"""
+        if name == "ERROR:":
+            request = self._error_request(tokens)
+        elif name.endswith(":"):
+            # command specific error, e.g. #NVM RESCAN: [100] Module Unavailable
+            request = self._find_request(name[:-1])
+        else:
+            request = self._find_request(name)
+        if request is None:
+            return
+        if name.endswith(":"):
+            self.pending.remove(request)
+            request.future.set_exception(NVMError(request.command, tokens))
+        elif request.is_complete is None:
+            self.pending.remove(request)
+            request.future.set_result(tokens)
+        else:
+            request.lines.append(tokens)
+            if request.is_complete(tokens):
+                self.pending.remove(request)
+                request.future.set_result(request.lines)
+
+    def _fail_request(self, name, exc):
+        """Fail the oldest request waiting for a reply called `name`"""
+        if name == "ERROR:":
+            request = self._error_request()
+        else:
+            request = self._find_request(name.rstrip(":"))
+        if request is not None:
+            self.pending.remove(request)
+            request.future.set_exception(exc)
+
+    def _find_request(self, reply_name):
+        """Oldest unanswered request for `reply_name`"""
+        for request in self.pending:
+            if request.future.done():
+                # cancelled or timed out, removed when its callbacks run
+                continue
+            if request.reply_name == reply_name:
+                return request
+        return None
+
+    def _error_request(self, tokens=None):
+        """The request a generic ERROR: reply belongs to, None if unclear
+
+        Generic errors don't say which command failed. With a single request
+        in flight it is that one, with several the error is only logged and
+        the requests are left to their own replies or the reply timeout.
+        """
+        requests = [request for request in self.pending if not request.future.done()]
+        if len(requests) == 1:
+            return requests[0]
+        if requests and tokens is not None:
+            # the _ERROR_ handler logs the error itself
+            _LOG.debug(
+                "NVM error %s with %d requests in flight, not attributed",
+                " ".join(tokens),
+                len(requests),
+            )
+        return None
 
     async def ping(self):
         await self.send_command("PING")
@@ -381,92 +1155,112 @@ class NVMController:
         # messages seem to start with # and be terminted with Carriege Return (\r)
         unpr_msg = self.buffer + string
         parts = unpr_msg.split("\r\n")
+        debug = _LOG.isEnabledFor(logging.DEBUG)
+        trace = self.controller.trace
         for part in parts[0:-1]:
-            _LOG.debug(f"NVM event:{part}")
+            if debug:
+                _LOG.debug("NVM event:%s", part)
+            if trace is not None:
+                trace.record(NVM_RECEIVED, part)
             self.process_msg(part)
         self.buffer = parts[-1]
-        _LOG.debug(f"NVM buffer {self.buffer}")
+        if debug:
+            _LOG.debug("NVM buffer %s", self.buffer)
 
     def process_msg(self, msg):
-        tokens = shlex.split(msg)
+        self.controller.metrics.nvm_line()
+        tokens = tokenize_nvm(msg)
+        if len(tokens) < 2:
+            _LOG.warning(f"Unrecognised message from NVM {msg}")
+            return
         nvm = tokens.pop(0)  # #NVM token
         if nvm == "#NVM":
-            event = tokens.pop(0)
-            event = event.replace(":", "_")
-            event = event.replace("-", "minus")
-            event = event.replace("+", "plus")
-            method = getattr(self.__class__, "_" + event, None)
-            if method:
-                method(self, tokens)
-            else:
-                _LOG.warning(f"Unhandled message from NVM {msg} >{event}<")
-        elif re.fullmatch(r"\d+V\d*", nvm):
-            _LOG.debug(f"Voltage event {nvm} {tokens}")
+            name = tokens.pop(0)
+            method = self.handlers.get(name)
+            metrics = self.controller.metrics
+            try:
+                if method is None:
+                    metrics.unhandled_message(f"NVM {name}")
+                    _LOG.warning(f"Unhandled message from NVM {msg} >{name}<")
+                elif metrics.enabled:
+                    started = time.perf_counter()
+                    method(self, tokens)
+                    metrics.handled(f"NVM {name}", time.perf_counter() - started)
+                else:
+                    method(self, tokens)
+                if self.pending:
+                    self._resolve(name, tokens)
+            except Exception as e:
+                # a malformed line must not take the connection down
+                _LOG.warning("Failed to process NVM message %r: %r", msg, e)
+                self._fail_request(name, e)
+        elif _VOLTAGE.fullmatch(nvm):
+            _LOG.debug("Voltage event %s %s", nvm, tokens)
             self.process_voltage(nvm, tokens)
         else:
             _LOG.warning(f"Unrecognised message from NVM {msg}")
 
+    @handles("GOTOPRESET")
     def _GOTOPRESET(self, tokens):
-        _LOG.debug(f"Playing iRadio preset number {tokens[0]} {tokens[1]}")
+        _LOG.debug("Playing iRadio preset number %s %s", tokens[0], tokens[1])
 
+    @handles("PREAMP")
     def _PREAMP(self, tokens):
         # #NVM PREAMP 2 0 0 IRADIO OFF OFF OFF ON "iRadio" OFF
-        volume = tokens[0]
-        input = tokens[3]
         # Maybe do something with the rest of the tokens?
-        mute = tokens[4]
-        # input_label = tokens[8]
-        self.state.volume = volume
-        self.state.input = input
-        self.state.mute = mute == "ON"
+        self.state.preamp = PreampState(
+            volume=int(tokens[0]),
+            input=tokens[3],
+            mute=tokens[4] == "ON",
+            input_label=tokens[8] if len(tokens) > 8 else None,
+        )
 
-        _LOG.debug(f"Volume set  {tokens[0]} {tokens[1]}")
+        _LOG.debug("Volume set  %s %s", tokens[0], tokens[1])
 
+    @handles("VOL-")
     def _VOLminus(self, tokens):
         # #NVM VOL- 10 OK
-        volume = tokens[0]
-        self.state.volume = volume
+        self.state.volume = int(tokens[0])
 
+    @handles("VOL+")
     def _VOLplus(self, tokens):
         # #NVM VOL+ 10 OK
-        volume = tokens[0]
-        self.state.volume = volume
+        self.state.volume = int(tokens[0])
 
+    @handles("SETSTANDBY")
     def _SETSTANDBY(self, tokens):
         # NVM SETSTANDBY OK
         # standby status not reported, we need to query
         if tokens[0] != "OK":
             _LOG.warning(f"SETSTANDBY reports {tokens[0]}")
 
+    @handles("SETRVOL")
     def _SETRVOL(self, tokens):
         if tokens[0] != "OK":
             _LOG.warning(f"SETRVOL reports {tokens[0]}")
 
+    @handles("SETUNSOLICITED")
     def _SETUNSOLICITED(self, tokens):
         if tokens[0] != "OK":
             _LOG.warning(f"SETUNSOLICITED reports {tokens[0]}")
 
+    @handles("GETVIEWSTATE")
     def _GETVIEWSTATE(self, tokens):
         # #NVM GETVIEWSTATE INITPLEASEWAIT NA NA N N NA IRADIO NA NA NA NA
         # #NVM GETVIEWSTATE PLAYERRESTORINGHISTORY 0 2 N N NA IRADIO "Rás2RÚV901" "Rás 2 RÚV 90.1 FM" NA NA
         # #NVM GETVIEWSTATE PLAYING CONNECTING 2 N N NA IRADIO "Rás2RÚV901" "Rás 2 RÚV 90.1 FM" NA NA
         # #NVM GETVIEWSTATE PLAYING ANALYSING NA N N NA SPOTIFY NA NA NA NA
         # There is also GetViewState XML Event
-        state = na2none(tokens[0])
-        phase = na2none(tokens[1])
-        preset = na2none(tokens[2])
-        input = na2none(tokens[6])
-        compact_name = na2none(tokens[7])
-        fullname = na2none(tokens[9])
-        self.state.viewstate = {
-            "state": state,
-            "phase": phase,
-            "preset": preset,
-            "input": input,
-            "compact_name": compact_name,
-            "fullname": fullname,
-        }
+        self.state.viewstate = ViewState(
+            state=na2none(tokens[0]),
+            phase=na2none(tokens[1]),
+            preset=na2int(tokens[2]),
+            input=na2none(tokens[6]),
+            compact_name=na2none(tokens[7]),
+            fullname=na2none(tokens[9]),
+        )
 
+    @handles("ERROR:")
     def _ERROR_(self, tokens):
         # #NVM ERROR: [11] Command not allowed in current system configuration
         match tokens[0]:
@@ -475,76 +1269,83 @@ class NVMController:
             case _:
                 _LOG.warning("Error from NVM:" + " ".join(tokens))
 
+    @handles("GETBRIEFNP")
     def _GETBRIEFNP(self, tokens):
         # #NVM GETBRIEFNP PLAY "Rás 2 RÚV 90.1 FM" "http://http.cdnlayer.com/vt/logo/logo-1318.jpg" NA NA NA
         state = na2none(tokens[0])
         description = na2none(tokens[1])
         logo_url = na2none(tokens[2])
-        _LOG.debug(f"GETBRIEFNP {state} {description} >{logo_url}<")
-        self.state.briefnp = {
-            "state": state,
-            "description": description,
-            "logo_url": logo_url,
-        }
+        _LOG.debug("GETBRIEFNP %s %s >%s<", state, description, logo_url)
+        self.state.briefnp = BriefNowPlaying(state, description, logo_url)
 
+    @handles("GETBUFFERSTATE")
     def _GETBUFFERSTATE(self, tokens):
         # #NVM GETBUFFERSTATE 0
-        self.state.bufferstate = tokens[0]
+        self.state.bufferstate = int(tokens[0])
 
+    @handles("ALARMSTATE")
     def _ALARMSTATE(self, tokens):
         # #NVM ALARMSTATE TIME_ADJUST
         # Don't know what this is seems to happen every minute on the minute
         pass
 
+    @handles("SETINPUT")
     def _SETINPUT(self, tokens):
         # NVM SETINPUT OK
         if tokens[0] != "OK":
             _LOG.warning(f"SETINPUT reports {tokens[0]}")
 
+    @handles("GETINPUTBLK")
     def _GETINPUTBLK(self, tokens: list[str]):
         # NVM GETINPUTBLK 1 10 1 IRADIO "iRadio"
         # NVM GETINPUTBLK 2 10 1 MULTIROOM "Multiroom"
         index: int = int(tokens[0])
         id: str = tokens[3]
         name: str = tokens[4]
-        self.state.set_inputblk_entry(index, {"id": id, "name": name})
+        self.state.set_inputblk_entry(index, InputEntry(id, name))
 
+    @handles("GETSTANDBYSTATUS")
     def _GETSTANDBYSTATUS(self, tokens):
         # NVM GETSTANDBYSTATUS ON NETWORK
-        state = tokens[0]
-        type = tokens[1]
-        self.state.standbystatus = {"state": state, "type": type}
+        self.state.standbystatus = StandbyStatus(state=tokens[0], type=tokens[1])
 
+    @handles("PONG")
     def _PONG(self, tokens):
         pass
 
+    @handles("GETVIEWMESSAGE")
     def _GETVIEWMESSAGE(self, tokens):
         # NVM GETVIEWMESSAGE SKIPFILE
         pass
 
+    @handles("PLAY")
     def _PLAY(self, tokens):
         # NVM PLAY OK
         if tokens[0] != "OK":
             _LOG.warning(f"PLAY reports {tokens[0]}")
 
+    @handles("PRODUCT")
     def _PRODUCT(self, tokens):
         # NVM PRODUCT MUSO
         self.state.product = tokens[0]
 
+    @handles("GETSERIALNUM")
     def _GETSERIALNUM(self, tokens):
         # NVM GETSERIALNUM 1107010284
         self.state.serialnum = tokens[0]
 
+    @handles("GETROOMNAME")
     def _GETROOMNAME(self, tokens):
         # NVM GETROOMNAME "Livingroom"
         self.state.roomname = tokens[0]
 
+    @handles("GETTOTALPRESETS")
     def _GETTOTALPRESETS(self, tokens):
         # NVM GETTOTALPRESETS 40
-        self.state.totalpresets = tokens[0]
-        # do this her while we don't have any event processing or waiting for response
-        asyncio.create_task(self.send_command(f"GETPRESETBLK 1 {tokens[0]}"))
+        # the presets themselves are fetched by fetch_blocks
+        self.state.totalpresets = int(tokens[0])
 
+    @handles("GETPRESETBLK")
     def _GETPRESETBLK(self, tokens: list[str]):
         # NVM GETPRESETBLK 1 40 USED "Rás 1 RÚV 93.5 FM" INTERNET 0 NONE NORMAL
         # NVM GETPRESETBLK 2 40 USED "Rás 2 RÚV 90.1 FM" INTERNET 0 NONE NORMAL
@@ -553,10 +1354,9 @@ class NVMController:
         state: str = tokens[2]
         name: str = tokens[3]
         transport: str = tokens[4]
-        self.state.set_presetblk_entry(
-            index, {"state": state, "name": name, "transport": transport}
-        )
+        self.state.set_presetblk_entry(index, PresetEntry(state, name, transport))
 
+    @handles("GETIC")
     def _GETIC(self, tokens: list[str]):
         # #NVM GETIC Psu ADC 757 ~ 31 degC)
         # #NVM GETIC MAIN ADC 812 ~ 23 degC)
@@ -568,6 +1368,7 @@ class NVMController:
         temp: int = int(tokens[4])
         self.state.set_unit_temp(unit, {"adc": adc, "temp": temp})
 
+    @handles("SETILLUM")
     def _SETILLUM(self, tokens):
         # *NVM SETILLUM 2
         # #NVM SETILLUM OK
@@ -575,11 +1376,13 @@ class NVMController:
         if illum != "OK":
             self.state.illum = int(illum)
 
+    @handles("GETILLUM")
     def _GETILLUM(self, tokens):
         # #NVM GETILLUM 2
         illum = int(tokens[0])
         self.state.illum = illum
 
+    @handles("PSU")
     def _PSU(self, tokens):
         # Handles PSU status messages such as "PSU Manager Idle", "PSU in standby", or "PSU = Digital Rails ON".
         # Currently, these messages are informational and not processed further.
@@ -1,25 +1,132 @@
 import logging
 import socket
 import asyncio
+import random
+import time
 import datetime as dt
+from .browse import PAGE_SIZE
+from .cache import StateCache, load_static_data, static_data
+from .connection import NAIM_SOCKET_API_PORT
 from .controllers import Controller
+from .metrics import NULL_METRICS, ControllerMetrics
+from .trace import WireTrace
+from .records import (
+    BriefNowPlaying,
+    InputEntry,
+    PositionAnchor,
+    PreampState,
+    PresetEntry,
+    StandbyStatus,
+    ViewState,
+)
 
 _LOG = logging.getLogger(__name__)
 
 
+class ReconnectStats:
+    """Connection attempts and reconnect timings of a NaimCo device
+
+    Durations are in seconds, times are time.monotonic() values.
+    """
+
+    __slots__ = (
+        "attempts",
+        "failures",
+        "reconnects",
+        "consecutive_failures",
+        "last_backoff",
+        "last_connect_duration",
+        "last_ready_duration",
+        "last_downtime",
+        "connected_at",
+        "disconnected_at",
+    )
+
+    def __init__(self):
+        #: Connection attempts, including the first one
+        self.attempts = 0
+        #: Attempts that failed to connect or initialize
+        self.failures = 0
+        #: Successful connections after a lost connection
+        self.reconnects = 0
+        self.consecutive_failures = 0
+        #: Last sleep before reconnecting
+        self.last_backoff = None
+        #: From starting to connect to initialized
+        self.last_connect_duration = None
+        #: From starting to connect to having refreshed the state
+        self.last_ready_duration = None
+        #: From losing the connection to having refreshed the state again
+        self.last_downtime = None
+        self.connected_at = None
+        self.disconnected_at = None
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
 class NaimCo:
     """The main class for interacting with a Naim Mu-so device.
 
     This is the class that the "end user" will interact with.
     """
 
-    def __init__(self, ip_address, callback=None):
+    #: Reconnect backoff grows exponentially from this many seconds
+    RECONNECT_BACKOFF_MIN = 1.0
+    #: Upper limit of the reconnect backoff in seconds
+    RECONNECT_BACKOFF_MAX = 120.0
+    #: Seconds a connection must have lasted for the backoff to start over
+    RECONNECT_STABLE_TIME = 30.0
+
+    def __init__(
+        self,
+        ip_address,
+        callback=None,
+        coalesce_window=0.0,
+        notify_changes=False,
+        cache_path=None,
+        port=NAIM_SOCKET_API_PORT,
+        metrics=False,
+        wire_trace=0,
+        send_max_latency=0.0,
+        send_max_batch=64,
+    ):
         """Initialize a NaimCo instance.
 
         Parameters
         ----------
         ip_address : str
             IP-address of the Mu-so speaker.
+        callback : coroutine function
+            Called with the state when it changes.
+        coalesce_window : float
+            Seconds to collect state changes before calling the callback. The
+            callback is called at most once per window and never later than
+            the window after the first change. 0 calls it after every packet
+            that changed the state.
+        notify_changes : bool
+            Call the callback as callback(state, changed) where changed is a
+            frozenset of the names of the fields changed since the last call.
+        cache_path : str | os.PathLike
+            File to keep the static data of the device in, like the product
+            and the inputs. It is loaded on startup so the device is usable
+            before that data has been fetched, and then revalidated with the
+            device.
+        port : int
+            TCP port of the socket API, only changed for fake devices.
+        metrics : bool
+            Keep traffic metrics in `metrics`, see naimco.metrics. They cost
+            next to nothing when turned off.
+        wire_trace : int
+            Keep the last this many messages to and from the device in
+            `wire_trace`, a naimco.trace.WireTrace that can be dumped when
+            needed. 0 keeps none.
+        send_max_latency : float
+            Seconds an outgoing command may wait for others to be written
+            with it in one batch, 0 batches the commands sent in the same
+            event loop iteration.
+        send_max_batch : int
+            Maximum number of commands written in one batch.
 
         Raises
         ------
@@ -35,23 +142,51 @@ class NaimCo:
             raise ValueError("Not a valid IP address string") from error
         #: The systems's ip address
         self.ip_address = ip_address
+        self.port = port
         self.cmd_id = 0
         self.state = NaimState()
         self.last_scn = self.state.scn
         self.controller = None
         self.version = None
         self.callback = callback
+        self.coalesce_window = coalesce_window
+        self.notify_changes = notify_changes
+        self._notify_handle = None
+        self._notify_tasks = set()
+        #: Random extra delay in seconds added to each reconnect backoff
+        self.reconnect_jitter = 0.0
+        self.reconnect_stats = ReconnectStats()
+        self.metrics = ControllerMetrics() if metrics else NULL_METRICS
+        self.wire_trace = WireTrace(wire_trace) if wire_trace else None
+        #: TCP keepalive (idle, interval, count) for the connection, None for off
+        self.tcp_keepalive = None
+        self.send_max_latency = send_max_latency
+        self.send_max_batch = send_max_batch
+        self.cache = StateCache(cache_path) if cache_path else None
+        self._cache_entry = None
+        self._cache_validated = False
+        self._tasks = None
         _LOG.debug("Created NaimCo instance for ip: %s", ip_address)
 
-    async def startup(self, timeout=None):
+    async def startup(self, timeout=None, keep_alive=True):
         """Connect to the Mu-so device and get the initial state.
 
         This method should be called before any other interaction with the device.
+
+        Parameters
+        ----------
+        timeout : int
+            Heartbeat timeout in seconds for the Mu-so device.
+        keep_alive : bool
+            Run a keep alive task pinging the device within the timeout. Turn
+            off when something else, like NaimFleet, takes care of pinging.
         """
         # Note: This method should be called after the event loop is running
         # and before any other interaction with the device is attempted.
         _LOG.debug("Starting up NaimCo instance for ip: %s", self.ip_address)
-        self._tasks = asyncio.create_task(self.run_tasks(timeout))
+        if self.cache and self._cache_entry is None:
+            await self.load_cache()
+        self._tasks = asyncio.create_task(self.run_tasks(timeout, keep_alive))
 
     async def update_data(self):
         if self.controller:
@@ -68,68 +203,224 @@ class NaimCo:
         """
         await self.controller.connection_runner()
 
-    async def run_tasks(self, interval: int | None):
-        """Run tasks in parallel."""
-        reconnect_backoff_time = 10
+    async def run_tasks(self, interval: int | None, keep_alive: bool = True):
+        """Run tasks in parallel.
+
+        Reconnects when the connection fails. The first retry is immediate,
+        after that the backoff doubles from RECONNECT_BACKOFF_MIN up to
+        RECONNECT_BACKOFF_MAX. A reconnect to a device whose static data is
+        already known resumes with a quick refresh of the playback state only.
+        """
+        stats = self.reconnect_stats
+        retries = 0
         while True:
+            if retries:
+                await self._reconnect_sleep(retries)
             self.controller = Controller(self)
+            resume = stats.connected_at is not None or self._cache_entry is not None
+            started = time.monotonic()
+            stats.attempts += 1
             try:
                 await self.controller.connect()
-                await self.initialize(interval)
+                await self.initialize(interval, resume=resume)
             except Exception as e:
                 _LOG.error(f"Failed to connect to controller {e}")
-                await asyncio.sleep(reconnect_backoff_time)
-                reconnect_backoff_time += 10
-                reconnect_backoff_time = min(reconnect_backoff_time, 120)
+                stats.failures += 1
+                stats.consecutive_failures += 1
+                retries += 1
+                try:
+                    # close the connection if connect() got that far
+                    await self.controller.shutdown()
+                except Exception as e:
+                    _LOG.error(f"Failed to shutdown controller {e}")
                 continue
-            reconnect_backoff_time = 10
+            stats.last_connect_duration = time.monotonic() - started
+            stats.consecutive_failures = 0
+            ready_at = None
             try:
                 async with asyncio.TaskGroup() as tg:
                     tg.create_task(self.runner_task())
-                    if interval:
+                    if interval and keep_alive:
                         tg.create_task(self.controller.keep_alive(interval))
-                    await self.controller.request_data_update()
+                    await self.controller.request_data_update(full=not resume)
+                    ready_at = self._connected(started)
+                    if self.cache and not self._cache_validated:
+                        tg.create_task(self._revalidate_cache())
             except* Exception as e:
                 _LOG.info(f"Tasks failed! {e.exceptions}")
+                stats.disconnected_at = time.monotonic()
+                if (
+                    ready_at is not None
+                    and stats.disconnected_at - ready_at >= self.RECONNECT_STABLE_TIME
+                ):
+                    retries = 0
+                retries += 1
                 try:
                     await self.controller.shutdown()
                 except Exception as e:
                     _LOG.error(f"Failed to shutdown controller {e}")
                 finally:
                     self.controller = None
-                    await asyncio.sleep(reconnect_backoff_time)
 
                 # await self._device_disconnect()
 
-    async def initialize(self, timeout=None):
+    def _connected(self, started):
+        """Record the timings of a connection that is ready for use"""
+        stats = self.reconnect_stats
+        now = time.monotonic()
+        stats.last_ready_duration = now - started
+        if stats.disconnected_at is not None:
+            stats.reconnects += 1
+            self.metrics.reconnect()
+            stats.last_downtime = now - stats.disconnected_at
+            _LOG.info(
+                f"Reconnected to {self.ip_address} after {stats.last_downtime:.1f} s"
+            )
+        stats.connected_at = now
+        return now
+
+    async def load_cache(self):
+        """Load the static data of the device from the cache
+
+        Returns
+        -------
+        bool
+            True if the device was found in the cache.
+        """
+        entry = await asyncio.to_thread(self.cache.load, self.ip_address)
+        if entry is None:
+            return False
+        try:
+            load_static_data(self.state, entry)
+        except (KeyError, TypeError, ValueError) as e:
+            _LOG.warning(f"Ignoring invalid cache entry for {self.ip_address}: {e}")
+            self.state.clear_static_data()
+            return False
+        self._cache_entry = entry
+        _LOG.debug("Loaded cached data for %s", self.ip_address)
+        return True
+
+    async def save_cache(self):
+        """Store the static data of the device in the cache if it changed"""
+        if not self.cache or not self.state.serialnum:
+            return
+        entry = static_data(self.state)
+        if entry != self._cache_entry:
+            await asyncio.to_thread(self.cache.store, self.ip_address, entry)
+            self._cache_entry = entry
+
+    async def _revalidate_cache(self):
+        """Fetch the static data again and update the cache with any changes"""
+        cached_serialnum = self.state.serialnum
+        try:
+            result = await self.controller.refresh_static()
+            if cached_serialnum and self.state.serialnum != cached_serialnum:
+                _LOG.info(
+                    f"Device at {self.ip_address} changed from {cached_serialnum}"
+                    f" to {self.state.serialnum}, dropping cached data"
+                )
+                serialnum = self.state.serialnum
+                self.state.clear_static_data()
+                self.state.serialnum = serialnum
+                result = await self.controller.refresh_static()
+            if result.timed_out or result.failed:
+                # try again on the next connection
+                return
+            self._cache_validated = True
+            await self.save_cache()
+        except Exception as e:
+            _LOG.warning(f"Failed to revalidate cached data: {e!r}")
+
+    def reconnect_backoff(self, retries):
+        """Seconds to wait before retry number `retries`
+
+        The first retry is immediate, later retries wait a random time between
+        half and all of an exponentially growing backoff. Every retry, the
+        first included, waits up to `reconnect_jitter` seconds more, so the
+        devices of a fleet don't all reconnect at once after a shared outage.
+        """
+        jitter = random.uniform(0, self.reconnect_jitter)
+        if retries <= 1:
+            return jitter
+        backoff = min(
+            self.RECONNECT_BACKOFF_MIN * 2 ** (retries - 2), self.RECONNECT_BACKOFF_MAX
+        )
+        return random.uniform(backoff / 2, backoff) + jitter
+
+    async def _reconnect_sleep(self, retries):
+        backoff = self.reconnect_backoff(retries)
+        self.reconnect_stats.last_backoff = backoff
+        _LOG.debug("Reconnecting to %s in %.1f s", self.ip_address, backoff)
+        await asyncio.sleep(backoff)
+
+    async def initialize(self, timeout=None, resume=False):
         """Initialize the device so it is ready to accept commands.
 
         Optionally set timeout interval in seconds for Mu-so device, if Mu-so does not receive
         a message in that interval it will disconnect.
         """
-        await self.controller.initialize()
+        await self.controller.initialize(resume)
         if timeout:
             await self.controller.set_heartbeat_timout(timeout)
 
     async def shutdown(self):
         """Close the connection to the Mu-so device."""
+        if self._notify_handle:
+            self._notify_handle.cancel()
+            self._notify_handle = None
         if self._tasks:
             self._tasks.cancel()
             try:
                 await self._tasks
             except asyncio.CancelledError:
                 _LOG.debug("Tasks cancelled")
-        await self.controller.shutdown()
+        try:
+            if self.controller:
+                await self.controller.shutdown()
+        finally:
+            try:
+                await self.save_cache()
+            except OSError as e:
+                _LOG.warning(f"Failed to save cache: {e}")
 
     async def _call_callback(self):
-        """Call the callback function if it is set and state.scn has changed"""
-        if self.callback and self.state.scn != self.last_scn:
-            self.last_scn = self.state.scn
+        """Call the callback function if it is set and state.scn has changed
+
+        With a coalesce window the call is delayed until the window has passed
+        so a burst of changes results in a single call.
+        """
+        if not self.callback or self.state.scn == self.last_scn:
+            return
+        if not self.coalesce_window:
+            await self._notify()
+        elif self._notify_handle is None:
+            self._notify_handle = asyncio.get_running_loop().call_later(
+                self.coalesce_window, self._notify_coalesced
+            )
+
+    def _notify_coalesced(self):
+        self._notify_handle = None
+        task = asyncio.create_task(self._notify())
+        self._notify_tasks.add(task)
+        task.add_done_callback(self._notify_done)
+
+    def _notify_done(self, task):
+        self._notify_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            _LOG.error(f"State callback failed {task.exception()!r}")
+
+    async def _notify(self):
+        changes = frozenset(self.state.changes_since(self.last_scn))
+        self.last_scn = self.state.scn
+        if self.notify_changes:
+            await self.callback(self.state, changes)
+        else:
             await self.callback(self.state)
 
     async def on(self):
-        await self.controller.nvm.send_command("SETSTANDBY OFF")
-        await asyncio.sleep(3)
+        await self.controller.nvm.send_command(
+            "SETSTANDBY OFF", wait_for_reply_timeout=3
+        )
         await self.controller.nvm.send_command("GETSTANDBYSTATUS")
 
     async def off(self):
@@ -213,11 +504,11 @@ class NaimCo:
 
     @property
     def inputs(self) -> dict[int, dict]:
-        return {inp["id"]: inp["name"] for inp in self.state.inputblk.values()}
+        return {inp.id: inp.name for inp in self.state.inputblk.values()}
 
     @property
     def presets(self) -> dict[int, dict]:
-        return {index: preset["name"] for index, preset in self.state.presetblk.items()}
+        return {index: preset.name for index, preset in self.state.presetblk.items()}
 
     async def select_input(self, input):
         await self.controller.nvm.send_command(f"SETINPUT {input}")
@@ -233,6 +524,20 @@ class NaimCo:
             f"SELECTROW {row}", wait_for_reply_timeout
         )
 
+    def browse(self, list_handle=None, count=None, start=1, page_size=PAGE_SIZE):
+        """Async iterator over the rows of a browse list
+
+        Rows are fetched in windows of `page_size` with GetRows, the next
+        window while the current one is consumed. Defaults to the active
+        list, see naimco.browse.iter_rows.
+
+        Example
+        -------
+        >>> async for row in device.browse():
+        ...     print(row["name"])
+        """
+        return self.controller.browse(list_handle, count, start, page_size)
+
     @property
     def viewstate(self):
         return self.state.viewstate
@@ -242,7 +547,7 @@ class NaimCo:
         """Image url of current playing media."""
         if not self.state.briefnp:
             return None
-        return self.state.briefnp.get("logo_url", None)
+        return self.state.briefnp.logo_url
         # self.state.briefnp = {'state':state,'description':description,'logo_url':logo_url}
 
     @property
@@ -294,6 +599,20 @@ class NaimCo:
     def now_playing_time(self) -> int | None:
         return self.state.now_playing_time
 
+    @property
+    def media_position(self) -> float | None:
+        """Play position in seconds, interpolated between the device updates"""
+        return self.state.media_position
+
+    @property
+    def media_position_updated_at(self) -> dt.datetime | None:
+        """When media_position was last anchored to an update from the device
+
+        Like media_position_updated_at of Home Assistant media players, the
+        callback is only called when this changes, not every second.
+        """
+        return self.state.media_position_updated_at
+
     def get_now_playing(self):
         resp = {}
         try:
@@ -324,6 +643,48 @@ class NaimCo:
 
 
 class NaimState:
+    """State of a Mu-so device, updated from the messages it sends.
+
+    Structured values are stored as small immutable records from
+    naimco.records, comparing them is a plain tuple compare.
+    """
+
+    __slots__ = (
+        "scn",
+        "last_update",
+        "_input",
+        "_volume",
+        "_standbystatus",
+        "_bufferstate",
+        "_inputblk",
+        "_viewstate",
+        "_briefnp",
+        "_preamp",
+        "_product",
+        "_serialnum",
+        "_roomname",
+        "_totalpresets",
+        "_presetblk",
+        "_mute",
+        "_unit_temps",
+        "_voltages",
+        "_illum",
+        "_cleaningmode",
+        "view_state",
+        "now_playing",
+        "now_playing_time",
+        "active_list",
+        "rows",
+        "bridge_co_app_versions",
+        "_field_scn",
+        "_block_hashes",
+        "_position_anchor",
+    )
+
+    #: Seconds a GetNowPlayingTime tick may differ from the interpolated
+    #: position before it counts as a seek; the ticks are whole seconds
+    POSITION_TOLERANCE = 2
+
     def __init__(self):
         # Sequence number, increment to send new state to HA
         self.scn = int(0)
@@ -331,16 +692,17 @@ class NaimState:
         # NVM properties
         self._input: str | None = None
         self._volume: int | None = None
-        self._standbystatus: dict | None = None
+        self._standbystatus: StandbyStatus | None = None
         self._bufferstate: int | None = None
-        self._inputblk: dict[int, dict] = {}
-        self._viewstate: dict | None = None
-        self._briefnp: dict | None = None
+        self._inputblk: dict[int, InputEntry] = {}
+        self._viewstate: ViewState | None = None
+        self._briefnp: BriefNowPlaying | None = None
+        self._preamp: PreampState | None = None
         self._product: str | None = None
         self._serialnum: str | None = None
         self._roomname: str | None = None
         self._totalpresets: int | None = None
-        self._presetblk: dict[int, dict] = {}
+        self._presetblk: dict[int, PresetEntry] = {}
         self._mute: bool = False
         self._unit_temps: dict = {}
         self._voltages: dict = {}
@@ -355,8 +717,45 @@ class NaimState:
         self.rows = None
         self.bridge_co_app_versions = None
 
-    def inc_scn(self):
+        # scn of the last change of each field
+        self._field_scn: dict[str, int] = {}
+        # content hash of the inputblk and presetblk when last finished
+        self._block_hashes: dict[str, int] = {}
+        self._position_anchor: PositionAnchor | None = None
+
+    def inc_scn(self, field: str | None = None):
+        """Bump the sequence number, recording it as the last change of `field`
+
+        Without a field only the global sequence number moves, the change
+        then shows up in no field_scn or changes_since.
+        """
         self.scn += 1
+        if field is not None:
+            self._field_scn[field] = self.scn
+
+    def field_scn(self, field: str) -> int:
+        """Sequence number of the last change of `field`, 0 if never changed"""
+        return self._field_scn.get(field, 0)
+
+    def changes_since(self, scn: int) -> dict:
+        """Fields changed after sequence number `scn` with their current values
+
+        Parameters
+        ----------
+        scn : int
+            A sequence number previously read from `scn`.
+
+        Returns
+        -------
+        dict
+            Current value of each field modified since `scn`, keyed by the
+            name of the field.
+        """
+        return {
+            field: getattr(self, field)
+            for field, field_scn in self._field_scn.items()
+            if field_scn > scn
+        }
 
     @property
     def volume(self) -> int | None:
@@ -366,7 +765,7 @@ class NaimState:
     def volume(self, volume: int):
         if volume != self._volume:
             self._volume = volume
-            self.inc_scn()
+            self.inc_scn("volume")
 
     @property
     def mute(self) -> bool:
@@ -376,7 +775,7 @@ class NaimState:
     def mute(self, mute: bool):
         if mute != self._mute:
             self._mute = mute
-            self.inc_scn()
+            self.inc_scn("mute")
 
     @property
     def input(self) -> str | None:
@@ -386,28 +785,44 @@ class NaimState:
     def input(self, input: str):
         if input != self._input:
             self._input = input
-            self.inc_scn()
+            self.inc_scn("input")
 
     @property
-    def viewstate(self) -> dict | None:
+    def viewstate(self) -> ViewState | None:
         return self._viewstate
 
     @viewstate.setter
-    def viewstate(self, state: dict | None):
+    def viewstate(self, state: ViewState | None):
         """NVM view state"""
         if state != self._viewstate:
             self._viewstate = state
-            self.inc_scn()
+            self.inc_scn("viewstate")
+            if state is not None:
+                self.set_playing(state.state == "PLAYING")
 
     @property
-    def briefnp(self) -> dict | None:
+    def briefnp(self) -> BriefNowPlaying | None:
         return self._briefnp
 
     @briefnp.setter
-    def briefnp(self, briefnp: dict | None):
+    def briefnp(self, briefnp: BriefNowPlaying | None):
         if briefnp != self._briefnp:
             self._briefnp = briefnp
-            self.inc_scn()
+            self.inc_scn("briefnp")
+
+    @property
+    def preamp(self) -> PreampState | None:
+        return self._preamp
+
+    @preamp.setter
+    def preamp(self, preamp: PreampState):
+        """Preamp settings, also updates volume, input and mute"""
+        if preamp != self._preamp:
+            self._preamp = preamp
+            self.inc_scn("preamp")
+            self.volume = preamp.volume
+            self.input = preamp.input
+            self.mute = preamp.mute
 
     @property
     def bufferstate(self) -> int | None:
@@ -418,21 +833,22 @@ class NaimState:
         self._bufferstate = bufferstate
 
     @property
-    def standbystatus(self) -> dict | None:
+    def standbystatus(self) -> StandbyStatus | None:
         return self._standbystatus
 
     @standbystatus.setter
-    def standbystatus(self, standbystatus: dict):
+    def standbystatus(self, standbystatus: StandbyStatus):
         if standbystatus != self._standbystatus:
             self._standbystatus = standbystatus
-            self.inc_scn()
+            self.inc_scn("standbystatus")
 
     @property
-    def inputblk(self) -> dict[int, dict]:
+    def inputblk(self) -> dict[int, InputEntry]:
         return self._inputblk
 
-    def set_inputblk_entry(self, index: int, val: dict):
-        self._inputblk[index] = val
+    def set_inputblk_entry(self, index: int, val: InputEntry):
+        if self._inputblk.get(index) != val:
+            self._inputblk[index] = val
 
     @property
     def product(self) -> str | None:
@@ -467,15 +883,59 @@ class NaimState:
         self._totalpresets = totalpresets
 
     @property
-    def presetblk(self) -> dict[int, dict]:
+    def presetblk(self) -> dict[int, PresetEntry]:
         return self._presetblk
 
-    def set_presetblk_entry(self, index: int, val: dict):
-        _LOG.debug(f"presetblk_entry {index} {val}")
-        if val["state"] == "USED":
-            self._presetblk[index] = val
-        else:
+    def clear_static_data(self):
+        """Forget the data that is otherwise only fetched once"""
+        self._product = None
+        self._serialnum = None
+        self._roomname = None
+        self._totalpresets = None
+        self._inputblk.clear()
+        self._presetblk.clear()
+        self._block_hashes.clear()
+        self.bridge_co_app_versions = None
+
+    def set_presetblk_entry(self, index: int, val: PresetEntry):
+        _LOG.debug("presetblk_entry %s %s", index, val)
+        if val.state != "USED":
             self._presetblk.pop(index, None)
+        elif self._presetblk.get(index) != val:
+            self._presetblk[index] = val
+
+    def has_block(self, field: str) -> bool:
+        """Has a complete "inputblk" or "presetblk" been stored?"""
+        return field in self._block_hashes
+
+    def finish_block(self, field: str, indices) -> bool:
+        """A complete input or preset block has been stored
+
+        Entries the device did not report are dropped. The scn is only
+        increased when the content hash of the block differs from the last
+        time, refreshing an unchanged block is not a change.
+
+        Parameters
+        ----------
+        field : str
+            "inputblk" or "presetblk".
+        indices : set[int]
+            Indices of the entries in the block.
+
+        Returns
+        -------
+        bool
+            True if the block changed.
+        """
+        block = self._inputblk if field == "inputblk" else self._presetblk
+        for index in [index for index in block if index not in indices]:
+            del block[index]
+        content_hash = hash(tuple(sorted(block.items())))
+        if self._block_hashes.get(field) == content_hash:
+            return False
+        self._block_hashes[field] = content_hash
+        self.inc_scn(field)
+        return True
 
     def set_view_state(self, state):
         self.view_state = state
@@ -485,7 +945,7 @@ class NaimState:
             self.now_playing = state
             self.last_update["now_playing"] = dt.datetime.utcnow()
 
-            self.inc_scn()
+            self.inc_scn("now_playing")
 
     def set_active_list(self, state):
         self.active_list = state
@@ -494,11 +954,55 @@ class NaimState:
         self.rows = state
 
     def set_now_playing_time(self, state):
-        if self.now_playing_time != state:
-            self.now_playing_time = state
-            self.last_update["now_playing_time"] = dt.datetime.utcnow()
+        """Play time in seconds, sent by the device every second while playing
+
+        The time is stored as a position anchor that media_position moves on
+        from. Only times that don't follow from the anchor, after a seek or a
+        track change, move the anchor and count as a change of
+        "media_position", steady ticks don't wake the callback. Ticks never
+        change whether the position moves, that follows the view state.
+        """
+        self.now_playing_time = state
+        now = time.monotonic()
+        anchor = self._position_anchor
+        if anchor is not None:
+            if abs(state - anchor.position_at(now)) < self.POSITION_TOLERANCE:
+                return
+            playing = anchor.playing
+        else:
+            playing = self._viewstate is None or self._viewstate.state == "PLAYING"
+        self._set_position_anchor(state, now, playing)
+
+    def set_playing(self, playing: bool):
+        """Start or stop moving the play position on from the anchor"""
+        anchor = self._position_anchor
+        if anchor is not None and anchor.playing != playing:
+            now = time.monotonic()
+            self._set_position_anchor(anchor.position_at(now), now, playing)
+
+    def _set_position_anchor(self, position, monotonic, playing):
+        self._position_anchor = PositionAnchor(
+            position, monotonic, dt.datetime.now(dt.timezone.utc), playing
+        )
+        self.inc_scn("media_position")
+
+    @property
+    def position_anchor(self) -> PositionAnchor | None:
+        return self._position_anchor
 
-            self.inc_scn()
+    @property
+    def media_position(self) -> float | None:
+        """Play position in seconds now, moved on from the anchor while playing"""
+        if self._position_anchor is None:
+            return None
+        return self._position_anchor.position_at(time.monotonic())
+
+    @property
+    def media_position_updated_at(self) -> dt.datetime | None:
+        """When the play position was last anchored, as a UTC datetime"""
+        if self._position_anchor is None:
+            return None
+        return self._position_anchor.updated_at
 
     def set_bridge_co_app_versions(self, state):
         self.bridge_co_app_versions = state
@@ -517,7 +1021,7 @@ class NaimState:
     def illum(self, illum: int | None):
         if illum != self._illum:
             self._illum = illum
-            self.inc_scn()
+            self.inc_scn("illum")
 
     @property
     def cleaningmode(self) -> bool | None:
@@ -527,4 +1031,4 @@ class NaimState:
     def cleaningmode(self, cleaningmode: bool | None):
         if cleaningmode != self._cleaningmode:
             self._cleaningmode = cleaningmode
-            self.inc_scn()
+            self.inc_scn("cleaningmode")
@@ -0,0 +1,433 @@
+"""Fake Mu-so device for tests and load testing.
+
+FakeMuso listens on a TCP port and speaks the port 15555 protocol described
+in api_sniffing/sniffing.rst: XML commands in, replies and events out, with
+NVM commands tunnelled in TunnelToHost and the NVM replies sent back in
+TunnelFromHost events. It can also replay a session captured with
+RecordingProxy and inject the faults seen on real networks.
+
+Many fake devices can run on one machine, either on different ports or on
+different loopback addresses, 127.0.0.2, 127.0.0.3 and so on, on Linux.
+"""
+
+import logging
+import asyncio
+import base64
+import json
+import time
+import xml.etree.ElementTree as ET
+
+from .connection import NAIM_SOCKET_API_PORT
+from .msg_processing import MessageFramer
+
+_LOG = logging.getLogger(__name__)
+
+#: Canned NVM replies by command name, from api_sniffing/nvm_replies.txt
+DEFAULT_NVM_REPLIES = {
+    "SETUNSOLICITED": ["#NVM SETUNSOLICITED OK"],
+    "PRODUCT": ["#NVM PRODUCT MUSO"],
+    "GETSERIALNUM": ["#NVM GETSERIALNUM 1107010284"],
+    "GETROOMNAME": ['#NVM GETROOMNAME "Livingroom"'],
+    "GETVIEWSTATE": [
+        '#NVM GETVIEWSTATE PLAYING CONNECTING 2 N N NA IRADIO "Rás2RÚV901"'
+        ' "Rás 2 RÚV 90.1 FM" NA NA'
+    ],
+    "GETBRIEFNP": [
+        '#NVM GETBRIEFNP PLAY "Rás 2 RÚV 90.1 FM"'
+        ' "http://http.cdnlayer.com/vt/logo/logo-1318.jpg" NA NA NA'
+    ],
+    "GETSTANDBYSTATUS": ["#NVM GETSTANDBYSTATUS ON NETWORK"],
+    "GETINPUTBLK": [
+        '#NVM GETINPUTBLK 1 4 1 IRADIO "iRadio"',
+        '#NVM GETINPUTBLK 2 4 1 UPNP "UPnP"',
+        '#NVM GETINPUTBLK 3 4 1 SPOTIFY "Spotify"',
+        '#NVM GETINPUTBLK 4 4 1 DIGITAL1 "Digital"',
+    ],
+    "GETTOTALPRESETS": ["#NVM GETTOTALPRESETS 3"],
+    "GETPRESETBLK": [
+        '#NVM GETPRESETBLK 1 3 USED "Rás 1 RÚV 93.5 FM" INTERNET 0 NONE NORMAL',
+        '#NVM GETPRESETBLK 2 3 USED "Rás 2 RÚV 90.1 FM" INTERNET 0 NONE NORMAL',
+        '#NVM GETPRESETBLK 3 3 FREE "" NONE 0 NONE NORMAL',
+    ],
+    "GETTEMP": [
+        "#NVM GETIC Psu ADC 757 ~ 31 degC)",
+        "#NVM GETIC MAIN ADC 812 ~ 23 degC)",
+    ],
+    "GETPSU": [
+        "#NVM  PSU Manager Idle",
+        "1V2 reads 1209 mV",
+        "3V3 reads 3271 mV",
+        "#NVM GETIC BO_DETECT = 1",
+    ],
+    "GETILLUM": ["#NVM GETILLUM 2"],
+    "PING": ["#NVM PONG"],
+}
+
+#: Canned payloads of XML replies by command name
+DEFAULT_XML_REPLIES = {
+    "GetViewState": '<map><item name="state" string="play" /></map>',
+    "GetBridgeCoAppVersions": '<map><item name="version" string="1.0.0" /></map>',
+    "GetNowPlaying": (
+        "<map>"
+        '<item name="title" string="Morgunútvarpið" />'
+        '<item name="source" string="iradio" />'
+        "</map>"
+    ),
+}
+
+#: Handle of the browse list of the fake device
+LIST_HANDLE = 65
+
+#: Reply to unknown NVM commands
+UNKNOWN_NVM_REPLY = (
+    "#NVM ERROR: [11] Command not allowed in current system configuration"
+)
+
+
+def load_session(path):
+    """Read a session recorded by RecordingProxy
+
+    Returns
+    -------
+    list[tuple[float, str, bytes]]
+        (seconds since the connection was made, "device" or "client", data)
+        for each packet.
+    """
+    records = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                data = record["data"].encode("utf-8", "surrogateescape")
+                records.append((record["t"], record["from"], data))
+    return records
+
+
+def _session_line(t, sender, data):
+    # packets can end inside a multibyte character, surrogateescape keeps
+    # the bytes exact while the file stays readable
+    text = data.decode("utf-8", "surrogateescape")
+    return json.dumps({"t": round(t, 6), "from": sender, "data": text}) + "\n"
+
+
+def _tunnel_event(lines):
+    data = "".join(f"{line}\r\n" for line in lines).encode("utf-8")
+    encoded = base64.b64encode(data).decode("ascii")
+    return (
+        '<event name="TunnelFromHost"><map><item name="data">'
+        f"<base64>{encoded}</base64>"
+        "</item></map></event>"
+    ).encode("ascii")
+
+
+class FakeMuso:
+    """A fake Mu-so device
+
+    Answers XML commands from `xml_replies` and NVM commands from
+    `nvm_replies`, looked up by the full command, e.g. "GETPRESETBLK 1 3",
+    and then by command name. Volume and mute are kept as state so the
+    PREAMP replies follow the commands. With `rows` GetActiveList and
+    GetRows browse a list of that many tracks.
+
+    Faults
+    ------
+    chunk_size
+        Messages are written in chunks of this many bytes, each its own
+        packet, so they arrive split.
+    split_multibyte
+        Messages are split in the middle of their first multibyte UTF-8
+        character.
+    disconnect_after
+        The connection is dropped after sending this many messages, once.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=NAIM_SOCKET_API_PORT,
+        nvm_replies=None,
+        xml_replies=None,
+        session=None,
+        speed=1.0,
+        answer_commands=True,
+        chunk_size=None,
+        split_multibyte=False,
+        disconnect_after=None,
+        rows=None,
+    ):
+        """Create a fake device, it listens once started
+
+        Parameters
+        ----------
+        host : str
+            Address to listen on.
+        port : int
+            Port to listen on, 0 picks a free port.
+        nvm_replies : dict[str, list[str]]
+            Replies to NVM commands, added to DEFAULT_NVM_REPLIES.
+        xml_replies : dict[str, str]
+            Payloads of replies to XML commands, added to DEFAULT_XML_REPLIES.
+        session : str | os.PathLike | list
+            A session recorded by RecordingProxy, or loaded by load_session.
+            What the device sent in it is replayed to each new connection.
+        speed : float
+            Replay speed, 2 replays twice as fast as recorded.
+        answer_commands : bool
+            Answer commands, turn off to only replay the session.
+        rows : int
+            Number of rows in the browse list.
+        """
+        self.host = host
+        self.port = port
+        self.nvm_replies = {**DEFAULT_NVM_REPLIES, **(nvm_replies or {})}
+        self.xml_replies = {**DEFAULT_XML_REPLIES, **(xml_replies or {})}
+        if session is not None and not isinstance(session, list):
+            session = load_session(session)
+        self.session = session
+        self.speed = speed
+        self.rows = rows
+        self.answer_commands = answer_commands
+        self.chunk_size = chunk_size
+        self.split_multibyte = split_multibyte
+        self.disconnect_after = disconnect_after
+        self.volume = 7
+        self.mute = False
+        #: Received commands, the NVM ones as e.g. "*NVM GETVOL"
+        self.commands = []
+        self.connections = 0
+        self.messages_sent = 0
+        self._server = None
+        self._writers = set()
+        self._handlers = set()
+
+    async def start(self):
+        """Start listening, with port 0 `port` is set to the chosen port"""
+        self._server = await asyncio.start_server(
+            self._handle_client, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        _LOG.debug("Fake Mu-so listening on %s:%s", self.host, self.port)
+
+    async def stop(self):
+        """Stop listening and drop all connections"""
+        self.disconnect()
+        # let the handlers see the dropped connections and finish
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def disconnect(self):
+        """Drop all connections, like a device losing its network"""
+        for writer in list(self._writers):
+            writer.transport.abort()
+
+    async def _handle_client(self, reader, writer):
+        self.connections += 1
+        self._writers.add(writer)
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        framer = MessageFramer()
+        replay = None
+        if self.session:
+            replay = asyncio.create_task(self._replay(writer))
+        try:
+            while data := await reader.read(4096):
+                framer.feed(data)
+                for frame in framer.frames():
+                    if self.answer_commands:
+                        await self._answer(writer, ET.fromstring(frame))
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            _LOG.debug("Fake Mu-so connection lost: %r", e)
+        finally:
+            if replay:
+                replay.cancel()
+            self._writers.discard(writer)
+            self._handlers.discard(handler)
+            writer.close()
+
+    async def _replay(self, writer):
+        started = time.monotonic()
+        try:
+            for t, sender, data in self.session:
+                if sender != "device":
+                    continue
+                delay = started + t / self.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await self.send(writer, data)
+        except ConnectionError as e:
+            _LOG.debug("Fake Mu-so replay stopped: %r", e)
+
+    async def _answer(self, writer, command):
+        name = command.findtext("name")
+        id = command.findtext("id")
+        if name == "TunnelToHost":
+            data = base64.b64decode(command.findtext(".//base64"))
+            nvm_command = data.decode("utf-8").strip()
+            self.commands.append(nvm_command)
+            await self.send(writer, f'<reply name="{name}" id="{id}"></reply>')
+            lines = self.nvm_reply(nvm_command.removeprefix("*NVM").strip())
+            await self.send(writer, _tunnel_event(lines))
+            return
+        self.commands.append(name)
+        if self.rows is not None and name in ("GetActiveList", "GetRows"):
+            payload = self._browse_reply(name, command)
+        else:
+            payload = self.xml_replies.get(name, "")
+        await self.send(writer, f'<reply name="{name}" id="{id}">{payload}</reply>')
+
+    def _browse_reply(self, name, command):
+        if name == "GetActiveList":
+            return (
+                f'<map><item name="list_handle" int="{LIST_HANDLE}" />'
+                f'<item name="count" int="{self.rows}" /></map>'
+            )
+        items = {
+            item.findtext("name"): item.findtext("int") for item in command.iter("item")
+        }
+        first = int(items["from"])
+        last = min(int(items["to"]), self.rows)
+        rows = "".join(
+            "<map>"
+            f'<item name="name" string="Track {index}" />'
+            f'<item name="index" int="{index}" />'
+            '<item name="type" string="track" />'
+            "</map>"
+            for index in range(first, last + 1)
+        )
+        return f"<array>{rows}</array>"
+
+    def _preamp(self):
+        mute = "ON" if self.mute else "OFF"
+        return f'#NVM PREAMP {self.volume} 0 0 IRADIO {mute} OFF OFF OFF "iRadio" OFF'
+
+    def nvm_reply(self, command):
+        """Reply lines to an NVM command without the *NVM prefix"""
+        name, _, args = command.partition(" ")
+        if command in self.nvm_replies:
+            return self.nvm_replies[command]
+        if name in ("SETRVOL", "SETVOL") and args.isdigit():
+            self.volume = int(args)
+            return [self._preamp(), f"#NVM {name} OK"]
+        if name in ("VOL+", "VOL-"):
+            self.volume = max(0, self.volume + (1 if name == "VOL+" else -1))
+            return [self._preamp(), f"#NVM {name} {self.volume} OK"]
+        if name == "SETMUTE" and args in ("ON", "OFF"):
+            self.mute = args == "ON"
+            return [f"#NVM {name} OK", self._preamp()]
+        if name == "GETPREAMP":
+            return [self._preamp()]
+        if name == "GETVOL":
+            return [f"#NVM GETVOL {self.volume}"]
+        return self.nvm_replies.get(name, [UNKNOWN_NVM_REPLY])
+
+    async def send(self, writer, message):
+        """Send one message to a client, applying the configured faults"""
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+        chunks = [message]
+        if self.split_multibyte:
+            lead = next((i for i, byte in enumerate(message) if byte >= 0xC0), None)
+            if lead is not None:
+                chunks = [message[: lead + 1], message[lead + 1 :]]
+        if self.chunk_size:
+            chunks = [
+                chunk[i : i + self.chunk_size]
+                for chunk in chunks
+                for i in range(0, len(chunk), self.chunk_size)
+            ]
+        for chunk in chunks:
+            writer.write(chunk)
+            await writer.drain()
+            if len(chunks) > 1:
+                # give the client a chance to read each chunk on its own
+                await asyncio.sleep(0)
+        self.messages_sent += 1
+        if self.disconnect_after and self.messages_sent >= self.disconnect_after:
+            self.disconnect_after = None
+            writer.transport.abort()
+            raise ConnectionResetError("Fake Mu-so disconnected")
+
+
+class RecordingProxy:
+    """Records a session with a real device for FakeMuso to replay
+
+    Listens on `port` and forwards each connection to the device. Every
+    packet in either direction is appended to `path` as a JSON line with the
+    seconds since the connection was made, who sent it and the data.
+    """
+
+    def __init__(
+        self,
+        device_ip,
+        path,
+        host="127.0.0.1",
+        port=NAIM_SOCKET_API_PORT,
+        device_port=NAIM_SOCKET_API_PORT,
+    ):
+        self.device_ip = device_ip
+        self.device_port = device_port
+        self.path = path
+        self.host = host
+        self.port = port
+        self._server = None
+        self._writers = set()
+
+    async def start(self):
+        """Start listening, with port 0 `port` is set to the chosen port"""
+        self._server = await asyncio.start_server(
+            self._handle_client, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stop listening and drop all connections"""
+        for writer in list(self._writers):
+            writer.transport.abort()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _handle_client(self, client_reader, client_writer):
+        device_reader, device_writer = await asyncio.open_connection(
+            self.device_ip, self.device_port
+        )
+        started = time.monotonic()
+        self._writers.update((client_writer, device_writer))
+        with open(self.path, "a", encoding="utf-8") as file:
+
+            async def pipe(reader, writer, sender):
+                try:
+                    while data := await reader.read(4096):
+                        file.write(
+                            _session_line(time.monotonic() - started, sender, data)
+                        )
+                        file.flush()
+                        writer.write(data)
+                        await writer.drain()
+                finally:
+                    self._writers.discard(writer)
+                    writer.close()
+
+            await asyncio.gather(
+                pipe(client_reader, device_writer, "client"),
+                pipe(device_reader, client_writer, "device"),
+                return_exceptions=True,
+            )
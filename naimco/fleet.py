@@ -0,0 +1,174 @@
+import logging
+import asyncio
+import functools
+import heapq
+import random
+import time
+
+from .core import NaimCo
+
+_LOG = logging.getLogger(__name__)
+
+
+class NaimFleet:
+    """Runs many Mu-so devices on one event loop.
+
+    Each NaimCo normally runs its own keep alive task. The fleet instead
+    keeps one timer queue with the next ping deadline of every device and a
+    single task that sleeps until the earliest one, so the number of timers
+    does not grow with the number of devices. Startup and reconnects are
+    spread out with random jitter so the devices don't all hit the network
+    at the same moment.
+    """
+
+    def __init__(
+        self,
+        callback=None,
+        heartbeat_timeout=None,
+        startup_jitter=2.0,
+        reconnect_jitter=5.0,
+        coalesce_window=0.0,
+    ):
+        """Create a fleet
+
+        Parameters
+        ----------
+        callback : coroutine function
+            Called as callback(device, state) when the state of any device
+            changes.
+        heartbeat_timeout : int
+            Heartbeat timeout in seconds for the devices, they are pinged
+            when nothing else has been sent within that time.
+        startup_jitter : float
+            Device startups are spread randomly over this many seconds.
+        reconnect_jitter : float
+            Random extra delay in seconds added to each reconnect backoff.
+        coalesce_window : float
+            State changes of each device are collected for this many seconds
+            before the callback is called, see NaimCo.
+        """
+        self.callback = callback
+        self.heartbeat_timeout = heartbeat_timeout
+        self.startup_jitter = startup_jitter
+        self.reconnect_jitter = reconnect_jitter
+        self.coalesce_window = coalesce_window
+        self.devices: dict[str, NaimCo] = {}
+        self._deadlines = []
+        self._keep_alive_task = None
+        self._startup_tasks = set()
+        # running keep alive pings by IP address
+        self._pings: dict[str, asyncio.Task] = {}
+
+    def add(self, ip_address) -> NaimCo:
+        """Add a device to the fleet, it is started by start()"""
+        if ip_address in self.devices:
+            return self.devices[ip_address]
+        device = NaimCo(
+            ip_address,
+            callback=self._device_callback(ip_address),
+            coalesce_window=self.coalesce_window,
+        )
+        device.reconnect_jitter = self.reconnect_jitter
+        self.devices[ip_address] = device
+        if self.heartbeat_timeout:
+            heapq.heappush(self._deadlines, (time.monotonic(), ip_address))
+        return device
+
+    @property
+    def states(self):
+        """State of every device keyed by IP address"""
+        return {ip: device.state for ip, device in self.devices.items()}
+
+    async def start(self):
+        """Start all devices and the shared keep alive task"""
+        for device in self.devices.values():
+            task = asyncio.create_task(self._start_device(device))
+            self._startup_tasks.add(task)
+            task.add_done_callback(self._startup_tasks.discard)
+        if self.heartbeat_timeout and not self._keep_alive_task:
+            self._keep_alive_task = asyncio.create_task(self.keep_alive())
+
+    async def _start_device(self, device):
+        await asyncio.sleep(random.uniform(0, self.startup_jitter))
+        await device.startup(self.heartbeat_timeout, keep_alive=False)
+
+    async def shutdown(self):
+        """Stop the keep alive task and shut down all devices"""
+        for task in [
+            self._keep_alive_task,
+            *self._startup_tasks,
+            *self._pings.values(),
+        ]:
+            if task:
+                task.cancel()
+        self._keep_alive_task = None
+        results = await asyncio.gather(
+            *(device.shutdown() for device in self.devices.values()),
+            return_exceptions=True,
+        )
+        for ip, result in zip(self.devices, results, strict=True):
+            if isinstance(result, Exception):
+                _LOG.warning(f"Failed to shut down {ip}: {result}")
+
+    def _device_callback(self, ip_address):
+        async def callback(state):
+            if self.callback:
+                await self.callback(self.devices[ip_address], state)
+
+        return callback
+
+    async def keep_alive(self):
+        """Ping every connected device that is close to its heartbeat timeout
+
+        Runs as one task for the whole fleet.
+        """
+        while True:
+            next_deadline = self.ping_due(time.monotonic())
+            await asyncio.sleep(max(next_deadline - time.monotonic(), 0))
+
+    def ping_due(self, now):
+        """Ping the devices whose deadline has passed
+
+        Each ping runs in its own task, a device that does not answer does
+        not hold up the deadlines of the others.
+
+        Returns
+        -------
+        float
+            Monotonic time of the next deadline.
+        """
+        interval = self.heartbeat_timeout - 1
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, ip = heapq.heappop(self._deadlines)
+            device = self.devices.get(ip)
+            if device is None:
+                continue
+            controller = device.controller
+            if controller and controller.last_send_time is not None:
+                last_activity = controller.last_send_time
+                if controller.last_receive_time is not None:
+                    last_activity = min(last_activity, controller.last_receive_time)
+                deadline = last_activity + interval
+                if deadline <= now:
+                    self._ping(ip, controller)
+                    deadline = now + interval
+            else:
+                # not connected, check again later
+                deadline = now + interval
+            heapq.heappush(self._deadlines, (deadline, ip))
+        return self._deadlines[0][0] if self._deadlines else now + interval
+
+    def _ping(self, ip, controller):
+        running = self._pings.get(ip)
+        if running is not None and not running.done():
+            # still waiting for the reply to the last ping
+            return
+        task = asyncio.create_task(controller.ping())
+        self._pings[ip] = task
+        task.add_done_callback(functools.partial(self._ping_done, ip))
+
+    def _ping_done(self, ip, task):
+        if self._pings.get(ip) is task:
+            del self._pings[ip]
+        if not task.cancelled() and (exc := task.exception()):
+            _LOG.warning(f"Keep alive ping of {ip} failed: {exc!r}")
@@ -0,0 +1,240 @@
+import bisect
+
+#: Upper bounds in seconds of the reply latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Counts of observed values in fixed buckets"""
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        # the last count is for values above the largest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        """Cumulative bucket counts like Prometheus, the last bound is +Inf"""
+        buckets = []
+        total = 0
+        for bound, count in zip((*self.bounds, float("inf")), self.counts):
+            total += count
+            buckets.append((bound, total))
+        return {"buckets": buckets, "count": self.count, "sum": self.sum}
+
+
+class ControllerMetrics:
+    """Counters of the traffic with one device
+
+    Owned by NaimCo so the counts survive reconnects, the Controller and
+    NVMController report to it. Read the counts with snapshot() and turn
+    the snapshot into other formats with exporters like prometheus_text.
+    """
+
+    #: Hot paths skip their timing when False
+    enabled = True
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.frames_parsed = 0
+        self.frames_sent = 0
+        self.nvm_lines = 0
+        self.reconnects = 0
+        self.timeouts: dict[str, int] = {}
+        self.unhandled: dict[str, int] = {}
+        # message name -> [calls, seconds]
+        self.handler_time: dict[str, list] = {}
+        self.reply_latency: dict[str, Histogram] = {}
+
+    def received(self, nbytes, frames):
+        self.bytes_in += nbytes
+        self.frames_parsed += frames
+
+    def sent(self, nbytes):
+        self.bytes_out += nbytes
+        self.frames_sent += 1
+
+    def nvm_line(self):
+        self.nvm_lines += 1
+
+    def handled(self, name, seconds):
+        """A handler for messages called `name` ran for `seconds`"""
+        timing = self.handler_time.get(name)
+        if timing is None:
+            timing = self.handler_time[name] = [0, 0.0]
+        timing[0] += 1
+        timing[1] += seconds
+
+    def unhandled_message(self, name):
+        self.unhandled[name] = self.unhandled.get(name, 0) + 1
+
+    def reply(self, command, seconds):
+        """The reply to `command` arrived `seconds` after it was sent"""
+        histogram = self.reply_latency.get(command)
+        if histogram is None:
+            histogram = self.reply_latency[command] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+    def timeout(self, command):
+        self.timeouts[command] = self.timeouts.get(command, 0) + 1
+
+    def reconnect(self):
+        self.reconnects += 1
+
+    def snapshot(self) -> dict:
+        """All counts as a dict of plain values"""
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "frames_parsed": self.frames_parsed,
+            "frames_sent": self.frames_sent,
+            "nvm_lines": self.nvm_lines,
+            "reconnects": self.reconnects,
+            "timeouts": dict(self.timeouts),
+            "unhandled": dict(self.unhandled),
+            "handlers": {
+                name: {"calls": calls, "seconds": seconds}
+                for name, (calls, seconds) in self.handler_time.items()
+            },
+            "reply_latency": {
+                command: histogram.snapshot()
+                for command, histogram in self.reply_latency.items()
+            },
+        }
+
+
+class NullMetrics:
+    """Metrics that are not kept, every method does nothing"""
+
+    enabled = False
+
+    def received(self, nbytes, frames):
+        pass
+
+    def sent(self, nbytes):
+        pass
+
+    def nvm_line(self):
+        pass
+
+    def handled(self, name, seconds):
+        pass
+
+    def unhandled_message(self, name):
+        pass
+
+    def reply(self, command, seconds):
+        pass
+
+    def timeout(self, command):
+        pass
+
+    def reconnect(self):
+        pass
+
+    def snapshot(self) -> dict:
+        return {}
+
+
+NULL_METRICS = NullMetrics()
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels) + "}"
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def prometheus_text(snapshots, label="device", prefix="naimco"):
+    """Prometheus text exposition of metrics snapshots
+
+    Parameters
+    ----------
+    snapshots : dict[str, dict]
+        ControllerMetrics.snapshot() of each device, keyed by the value of
+        the device label, e.g. the IP address.
+    label : str
+        Name of the label telling the devices apart.
+    prefix : str
+        Prefix of the metric names.
+
+    Returns
+    -------
+    str
+        The metrics in the Prometheus text format.
+    """
+    lines = []
+
+    def family(name, kind, samples):
+        if not samples:
+            return
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+        for suffix, labels, value in samples:
+            lines.append(f"{prefix}_{name}{suffix}{_labels(labels)} {value}")
+
+    devices = [(device, s) for device, s in snapshots.items() if s]
+    for name, key in (
+        ("received_bytes_total", "bytes_in"),
+        ("sent_bytes_total", "bytes_out"),
+        ("frames_parsed_total", "frames_parsed"),
+        ("frames_sent_total", "frames_sent"),
+        ("nvm_lines_total", "nvm_lines"),
+        ("reconnects_total", "reconnects"),
+    ):
+        family(name, "counter", [("", [(label, d)], s[key]) for d, s in devices])
+    for name, key, sub_label in (
+        ("reply_timeouts_total", "timeouts", "command"),
+        ("unhandled_messages_total", "unhandled", "message"),
+    ):
+        family(
+            name,
+            "counter",
+            [
+                ("", [(label, d), (sub_label, k)], v)
+                for d, s in devices
+                for k, v in s[key].items()
+            ],
+        )
+    for name, field in (
+        ("handler_calls_total", "calls"),
+        ("handler_seconds_total", "seconds"),
+    ):
+        family(
+            name,
+            "counter",
+            [
+                ("", [(label, d), ("message", k)], v[field])
+                for d, s in devices
+                for k, v in s["handlers"].items()
+            ],
+        )
+    samples = []
+    for d, s in devices:
+        for command, histogram in s["reply_latency"].items():
+            labels = [(label, d), ("command", command)]
+            for bound, count in histogram["buckets"]:
+                samples.append(
+                    ("_bucket", [*labels, ("le", _format_bound(bound))], count)
+                )
+            samples.append(("_sum", labels, histogram["sum"]))
+            samples.append(("_count", labels, histogram["count"]))
+    family("reply_latency_seconds", "histogram", samples)
+    return "\n".join(lines) + "\n" if lines else ""
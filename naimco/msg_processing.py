@@ -1,10 +1,34 @@
 import logging
 import xml.etree.ElementTree as ET
 import base64
+import re
 
 _LOG = logging.getLogger(__name__)
 
 
+# NVM tokens are bare words or double quoted strings, a missing closing
+# quote ends the string at the end of the line.
+_NVM_TOKEN = re.compile(r'"([^"]*)"?|([^\s"]+)')
+
+
+def tokenize_nvm(line):
+    """Split an NVM reply line into tokens
+
+    Handles the simple grammar of NVM replies, tokens separated by whitespace
+    and double quoted strings that may contain whitespace, e.g.
+    ``#NVM GETROOMNAME "Living room"``. Unlike shlex.split apostrophes and
+    unbalanced quotes are not errors.
+
+    Returns
+    -------
+    list[str]
+        The tokens without quotes.
+    """
+    if '"' not in line:
+        return line.split()
+    return [bare or quoted for quoted, bare in _NVM_TOKEN.findall(line)]
+
+
 def dict_to_etree(d):
     def _to_etree(parent, d):
         if not d:
@@ -19,7 +43,7 @@ def dict_to_etree(d):
                 _to_etree(ET.SubElement(parent, k), v)
         elif isinstance(d, list):
             for i in d:
-                _LOG.debug(f"recursing this {i}")
+                _LOG.debug("recursing this %s", i)
                 parent.append(dict_to_etree(i))
         else:
             assert d == "invalid type", (type(d), d)
@@ -31,20 +55,123 @@ def dict_to_etree(d):
     return root
 
 
+def _escape(value):
+    """Escape text the same way ElementTree.tostring does.
+
+    Like ElementTree the result is ASCII, other characters are written as
+    character references.
+    """
+    if not isinstance(value, str):
+        value = str(value)
+    if "&" in value:
+        value = value.replace("&", "&amp;")
+    if "<" in value:
+        value = value.replace("<", "&lt;")
+    if ">" in value:
+        value = value.replace(">", "&gt;")
+    return value.encode("ascii", "xmlcharrefreplace")
+
+
+def _payload_shape(d, values):
+    """Return a hashable description of the structure of a payload.
+
+    Leaf values are appended to `values` in document order. Empty values
+    become empty elements, just like in `dict_to_etree`.
+    """
+    if not d:
+        return None
+    elif isinstance(d, (str, int)):
+        values.append(d)
+        return ""
+    elif isinstance(d, dict):
+        return ("dict", tuple((k, _payload_shape(v, values)) for k, v in d.items()))
+    elif isinstance(d, list):
+        return ("list", tuple(_payload_shape(i, values) for i in d))
+    else:
+        raise TypeError(f"Invalid type in payload {type(d)}")
+
+
+def _shape_to_template(tag, shape, parts):
+    """Append the XML for element `tag` with `shape` to `parts`.
+
+    Leaf values are marked with %b so the finished template can be filled
+    in with bytes formatting.
+    """
+    tag = tag.encode("ascii")
+    if shape is None:
+        parts.append(b"<" + tag + b" />")
+        return
+    parts.append(b"<" + tag + b">")
+    if shape == "":
+        parts.append(b"%b")
+    else:
+        kind, children = shape
+        if kind == "dict":
+            for k, v in children:
+                _shape_to_template(k, v, parts)
+        else:
+            for item in children:
+                # each list item is a dict with a single element
+                ((k, v),) = item[1]
+                _shape_to_template(k, v, parts)
+    parts.append(b"</" + tag + b">")
+
+
+_COMMAND_TEMPLATES = {}
+
+
+def _command_template(command, shape):
+    key = (command, shape)
+    template = _COMMAND_TEMPLATES.get(key)
+    if template is None:
+        name = _escape(command).replace(b"%", b"%%")
+        parts = [b"<command><name>" + name + b"</name><id>%b</id>"]
+        if shape is not None:
+            _shape_to_template("map", shape, parts)
+        parts.append(b"</command>")
+        template = b"".join(parts)
+        _COMMAND_TEMPLATES[key] = template
+    return template
+
+
 def gen_xml_command(command, id, map=None):
-    cmd = ET.Element("command")
-    name = ET.SubElement(cmd, "name")
-    name.text = command
-    idel = ET.SubElement(cmd, "id")
-    idel.text = id
-    if map:
-        cmd.append(dict_to_etree({"map": map}))
-    return ET.tostring(cmd).decode("utf-8")
+    """Encode a command as XML.
+
+    The XML for each combination of command name and payload structure is
+    built once and cached as a template, later commands of the same shape
+    only have their values filled in.
+
+    Parameters
+    ----------
+    command : str
+        Name of the command.
+    id : str
+        Command id, used by the Mu-so to tag the reply.
+    map : list | dict | None
+        Parameters to send with the command, in the format used by
+        `dict_to_etree`.
+
+    Returns
+    -------
+    bytes
+        The encoded XML command.
+    """
+    values = [id]
+    shape = _payload_shape(map, values) if map else None
+    template = _command_template(command, shape)
+    return template % tuple(_escape(v) for v in values)
 
 
 def tree_to_dict(element):
+    """Convert a reply, event, item or error element to a dict.
+
+    Returns
+    -------
+    tuple
+        The tag of the element and a dict with the value of the element keyed
+        by its name, plus id, code and description when present.
+    """
     if (tag := element.tag) in ["reply", "event", "item", "error"]:
-        # name = element.attrib['name']
         me = {}
         val = None
         for k, v in element.items():
@@ -76,7 +203,6 @@ def tree_to_dict(element):
                         if item.tag == "map":
                             map = {}
                             for it2 in item:
-                                _LOG.debug(f"item: {ET.tostring(it2)}")
                                 subtag, d = tree_to_dict(it2)
                                 map.update(d)
                             val.append(map)
@@ -95,27 +221,146 @@ def tree_to_dict(element):
     raise NotImplementedError(f"Unknown element {element.tag}")
 
 
+class MessageFramer:
+    """Split an incoming byte stream into complete top-level XML elements.
+
+    The Mu-so sends a continuous stream of ``<reply>``, ``<event>`` and
+    ``<error>`` elements with no other markers between them. Network packets
+    are not aligned with element boundaries, one packet can hold several
+    elements and one element can be split over several packets, possibly in
+    the middle of a multibyte UTF-8 character.
+
+    The framer works directly on bytes and only looks for the start tag of
+    each top-level element and its matching end tag, so no decoding or XML
+    parsing happens until a frame is complete.
+
+    Memory use is bounded, consumed bytes are dropped from the buffer and if
+    more than `max_frame_size` bytes accumulate without completing a frame
+    the buffer is discarded.
+    """
+
+    # Recreate the buffer after this many bytes have been consumed so the
+    # memory of a large frame (e.g. a long GetRows reply) is given back.
+    COMPACT_THRESHOLD = 64 * 1024
+
+    def __init__(self, max_frame_size=4 * 1024 * 1024):
+        self.buffer = bytearray()
+        self.max_frame_size = max_frame_size
+        self.consumed = 0
+        self.resets = 0
+
+    def feed(self, data: bytes):
+        """Add received bytes to the buffer."""
+        self.buffer += data
+
+    def reset(self):
+        """Drop all buffered data."""
+        self.buffer = bytearray()
+        self.consumed = 0
+        self.resets += 1
+
+    def frames(self):
+        """Return a list of the complete top-level elements in the buffer.
+
+        Incomplete trailing data is kept in the buffer until more bytes arrive.
+        """
+        buf = self.buffer
+        frames = []
+        pos = 0
+        end = len(buf)
+        while pos < end:
+            start = buf.find(b"<", pos)
+            if start < 0:
+                # only whitespace between elements
+                pos = end
+                break
+            frame_end = self._find_frame_end(buf, start)
+            if frame_end < 0:
+                pos = start
+                break
+            frames.append(bytes(buf[start:frame_end]))
+            pos = frame_end
+        self.consumed += pos
+        if self.consumed >= self.COMPACT_THRESHOLD:
+            self.buffer = bytearray(buf[pos:])
+            self.consumed = 0
+        else:
+            del buf[:pos]
+        if len(self.buffer) > self.max_frame_size:
+            _LOG.warning(
+                "Discarding %d bytes of incomplete message data", len(self.buffer)
+            )
+            self.reset()
+        return frames
+
+    @staticmethod
+    def _find_frame_end(buf, start):
+        """Find the end of the element starting at `start`, -1 if incomplete."""
+        name_end = start + 1
+        end = len(buf)
+        while name_end < end and buf[name_end] not in b" \t\r\n/>":
+            name_end += 1
+        if name_end == end:
+            return -1
+        # find the end of the start tag, '>' may appear inside quoted attributes
+        quote = None
+        pos = name_end
+        while pos < end:
+            char = buf[pos]
+            if quote:
+                if char == quote:
+                    quote = None
+            elif char in b"\"'":
+                quote = char
+            elif char == 0x3E:  # '>'
+                break
+            pos += 1
+        else:
+            return -1
+        if buf[pos - 1] == 0x2F:  # '/', self closing element
+            return pos + 1
+        close_tag = b"</" + bytes(buf[start + 1 : name_end])
+        close = buf.find(close_tag, pos + 1)
+        if close < 0:
+            return -1
+        close_end = buf.find(b">", close + len(close_tag))
+        if close_end < 0:
+            return -1
+        return close_end + 1
+
+
 class MessageStreamProcessor:
-    def __init__(self):
-        self.parser = ET.XMLPullParser(["start", "end"])
-        # fake tag to allow parsing of a stream og xml elements.
-        # TODO: Figure out if this leaks memory.
-        self.parser.feed("<stream>")
-        self.lvl = 0
+    """Turn the byte stream from the Mu-so into decoded messages.
+
+    Frames are located by `MessageFramer` and each complete frame is parsed
+    once and converted with `tree_to_dict`. The parsed element is cleared as
+    soon as it has been converted, so nothing but the decoded messages waiting
+    in `read_messages` is retained between calls to `feed`.
+    """
+
+    def __init__(self, max_frame_size=4 * 1024 * 1024):
+        self.framer = MessageFramer(max_frame_size)
         self.tree_buffer = []
 
-    def feed(self, data):
-        self.parser.feed(data)
-        for event, elem in self.parser.read_events():
-            if event == "start":
-                self.lvl += 1
-            elif event == "end":
-                self.lvl -= 1
-                if self.lvl == 1:
-                    # print(event)
-                    # print(elem.tag, 'name=', elem.get('name'))
-                    tag, dict = tree_to_dict(elem)
-                    self.tree_buffer.append((tag, dict))
+    def feed(self, data: bytes):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.framer.feed(data)
+        for frame in self.framer.frames():
+            elem = ET.fromstring(frame)
+            tag, dict = tree_to_dict(elem)
+            elem.clear()
+            self.tree_buffer.append((tag, dict))
+
+    @property
+    def pending_messages(self) -> int:
+        """Number of decoded messages held waiting for `read_messages`."""
+        return len(self.tree_buffer)
+
+    @property
+    def buffered_bytes(self) -> int:
+        """Number of bytes of incomplete messages held in the framer."""
+        return len(self.framer.buffer)
 
     def read_messages(self):
         res = iter(self.tree_buffer)
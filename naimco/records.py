@@ -0,0 +1,87 @@
+from collections import namedtuple
+
+
+class _DictAccess:
+    """Read access by field name, like the dicts these records replace.
+
+    ``record["name"]`` and ``record.get("name")`` keep working for code
+    written when the state was stored in dicts.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key in self._fields:
+                return getattr(self, key)
+            raise KeyError(key)
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key in self._fields:
+            return getattr(self, key)
+        return default
+
+
+class ViewState(
+    _DictAccess,
+    namedtuple(
+        "ViewState", ["state", "phase", "preset", "input", "compact_name", "fullname"]
+    ),
+):
+    """NVM view state, from #NVM GETVIEWSTATE"""
+
+    __slots__ = ()
+
+
+class BriefNowPlaying(
+    _DictAccess, namedtuple("BriefNowPlaying", ["state", "description", "logo_url"])
+):
+    """Brief now playing information, from #NVM GETBRIEFNP"""
+
+    __slots__ = ()
+
+
+class StandbyStatus(_DictAccess, namedtuple("StandbyStatus", ["state", "type"])):
+    """Standby status, from #NVM GETSTANDBYSTATUS"""
+
+    __slots__ = ()
+
+
+class PreampState(
+    _DictAccess, namedtuple("PreampState", ["volume", "input", "mute", "input_label"])
+):
+    """Preamp settings, from #NVM PREAMP"""
+
+    __slots__ = ()
+
+
+class InputEntry(_DictAccess, namedtuple("InputEntry", ["id", "name"])):
+    """An input, from #NVM GETINPUTBLK"""
+
+    __slots__ = ()
+
+
+class PresetEntry(
+    _DictAccess, namedtuple("PresetEntry", ["state", "name", "transport"])
+):
+    """A radio preset, from #NVM GETPRESETBLK"""
+
+    __slots__ = ()
+
+
+class PositionAnchor(
+    namedtuple("PositionAnchor", ["position", "monotonic", "updated_at", "playing"])
+):
+    """Play position at a point in time, from GetNowPlayingTime
+
+    While playing the position moves on from `position` at `monotonic`, a
+    time.monotonic() value, `updated_at` is the same moment as a UTC datetime.
+    """
+
+    __slots__ = ()
+
+    def position_at(self, monotonic: float) -> float:
+        if not self.playing:
+            return self.position
+        return self.position + max(0.0, monotonic - self.monotonic)
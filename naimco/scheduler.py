@@ -0,0 +1,226 @@
+import logging
+import asyncio
+import functools
+import heapq
+import itertools
+import time
+
+_LOG = logging.getLogger(__name__)
+
+#: Keep alive pings, sent before anything else
+PRIORITY_HIGH = 0
+#: Commands caused by the user, e.g. volume changes
+PRIORITY_USER = 1
+#: Polling for state, e.g. GETTEMP and GETPSU
+PRIORITY_BACKGROUND = 2
+
+
+def _retrieve_exception(future):
+    if not future.cancelled():
+        future.exception()
+
+
+def _copy_outcome(source, target):
+    """Resolve `target` like the done future `source`"""
+    if target.done():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+class QueuedCommand:
+    """A command waiting in the CommandScheduler
+
+    `sent` resolves when the command has been written to the connection and
+    `reply` with its reply. A command that is superseded by a newer one with
+    the same key shares the futures of the newer command.
+    """
+
+    __slots__ = ("priority", "seq", "key", "send", "queued_at", "sent", "reply")
+
+    def __init__(self, priority, seq, key, send, loop):
+        self.priority = priority
+        self.seq = seq
+        self.key = key
+        self.send = send
+        self.queued_at = time.monotonic()
+        self.sent = loop.create_future()
+        self.reply = loop.create_future()
+        self.sent.add_done_callback(_retrieve_exception)
+        self.reply.add_done_callback(_retrieve_exception)
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class CommandScheduler:
+    """Priority queue and rate limit for the commands sent to one device
+
+    Commands are sent at once while the token bucket has tokens, which holds
+    up to `burst` tokens and refills at `rate` tokens per second. When it is
+    empty commands wait in a queue, lowest priority number first, and are
+    sent as tokens become available. A queued command with a key is replaced
+    by a newer command with the same key. A keyed command is held back until
+    `hold` seconds after the last command with its key was sent, so a burst
+    of volume changes from a slider sends the first and then only the latest
+    one.
+    """
+
+    def __init__(self, rate=10.0, burst=20, hold=0.2):
+        """Create a scheduler
+
+        Parameters
+        ----------
+        rate : float
+            Commands per second, None disables the limit.
+        burst : int
+            Number of commands that can be sent at once after a quiet period.
+        hold : float
+            Seconds between commands with the same key.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._queue: list[QueuedCommand] = []
+        self._by_key: dict[str, QueuedCommand] = {}
+        self.hold = hold
+        # keyed commands waiting for their hold time, with the release timer
+        self._held: dict[str, tuple[QueuedCommand, asyncio.TimerHandle]] = {}
+        self._key_sent_at: dict[str, float] = {}
+        self._seq = itertools.count()
+        self._handle = None
+        #: Counters for monitoring backpressure
+        self.sent = 0
+        self.superseded = 0
+        self.max_depth = 0
+        self.last_wait = 0.0
+
+    @property
+    def depth(self):
+        """Number of commands waiting to be sent"""
+        return len(self._queue) + len(self._held)
+
+    def depth_by_priority(self):
+        """Number of waiting commands for each priority"""
+        depths = {}
+        held = (command for command, _ in self._held.values())
+        for command in itertools.chain(self._queue, held):
+            depths[command.priority] = depths.get(command.priority, 0) + 1
+        return depths
+
+    def submit(self, send, priority=PRIORITY_USER, key=None):
+        """Queue a command
+
+        Parameters
+        ----------
+        send : callable
+            Called without arguments when the command may be sent. Writes
+            the command and returns a tuple of the write waiter and the reply
+            future.
+        priority : int
+            PRIORITY_HIGH, PRIORITY_USER or PRIORITY_BACKGROUND.
+        key : str
+            Commands with the same key supersede each other while queued.
+
+        Returns
+        -------
+        QueuedCommand
+            Holds the `sent` and `reply` futures of the command.
+        """
+        if key is not None and (queued := self._by_key.get(key)):
+            # keep the place in the queue, send the newest command
+            queued.send = send
+            if priority < queued.priority:
+                queued.priority = priority
+                heapq.heapify(self._queue)
+            self.superseded += 1
+            _LOG.debug("Superseded queued %s command", key)
+            return queued
+        loop = asyncio.get_running_loop()
+        command = QueuedCommand(priority, next(self._seq), key, send, loop)
+        if key is not None:
+            self._by_key[key] = command
+            sent_at = self._key_sent_at.get(key)
+            if sent_at is not None:
+                delay = sent_at + self.hold - time.monotonic()
+                if delay > 0:
+                    release = loop.call_later(delay, self._release, key)
+                    self._held[key] = (command, release)
+                    self.max_depth = max(self.max_depth, self.depth)
+                    return command
+        self._enqueue(command)
+        return command
+
+    def _enqueue(self, command):
+        heapq.heappush(self._queue, command)
+        self.max_depth = max(self.max_depth, self.depth)
+        if self._handle is None:
+            self._dispatch()
+
+    def _release(self, key):
+        """The hold time of a keyed command is over, queue it to be sent"""
+        command, _ = self._held.pop(key)
+        self._enqueue(command)
+
+    def _take_token(self, now):
+        if not self.rate:
+            return True
+        self.tokens = min(
+            self.burst, self.tokens + (now - self._refilled_at) * self.rate
+        )
+        self._refilled_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def _dispatch(self):
+        """Send queued commands while there are tokens"""
+        self._handle = None
+        while self._queue:
+            now = time.monotonic()
+            if not self._take_token(now):
+                delay = (1 - self.tokens) / self.rate
+                loop = asyncio.get_running_loop()
+                self._handle = loop.call_later(delay, self._dispatch)
+                return
+            command = heapq.heappop(self._queue)
+            if command.key is not None:
+                del self._by_key[command.key]
+                self._key_sent_at[command.key] = now
+            self.last_wait = now - command.queued_at
+            self.sent += 1
+            try:
+                waiter, reply = command.send()
+            except Exception as e:
+                command.sent.set_exception(e)
+                command.reply.set_exception(e)
+                continue
+            waiter.add_done_callback(
+                functools.partial(_copy_outcome, target=command.sent)
+            )
+            reply.add_done_callback(
+                functools.partial(_copy_outcome, target=command.reply)
+            )
+
+    def close(self, exc=None):
+        """Fail all queued commands and stop sending"""
+        if self._handle:
+            self._handle.cancel()
+            self._handle = None
+        queue, self._queue = self._queue, []
+        for command, release in self._held.values():
+            release.cancel()
+            queue.append(command)
+        self._held.clear()
+        self._by_key.clear()
+        exc = exc or ConnectionAbortedError("Scheduler closed")
+        for command in queue:
+            for future in (command.sent, command.reply):
+                if not future.done():
+                    future.set_exception(exc)
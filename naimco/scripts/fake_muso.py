@@ -0,0 +1,67 @@
+"""Fake Mu-so devices.
+
+Runs one or more fake Mu-so devices for load testing, on consecutive ports
+or, with --loopback, on consecutive loopback addresses 127.0.0.2, 127.0.0.3
+and so on, all on the standard port.
+"""
+
+import logging
+import asyncio
+import argparse
+import ipaddress
+
+from naimco.fake_device import FakeMuso, load_session
+
+_LOG = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run fake naim Mu-so devices")
+    parser.add_argument("-n", "--count", type=int, default=1, help="Number of devices")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address")
+    parser.add_argument("--port", type=int, default=15555, help="First port")
+    parser.add_argument(
+        "--loopback",
+        action="store_true",
+        help="One loopback address per device instead of one port per device",
+    )
+    parser.add_argument("--session", type=str, help="Recorded session to replay")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed")
+    parser.add_argument("--chunk-size", type=int, help="Split messages in chunks")
+    parser.add_argument(
+        "--split-multibyte",
+        action="store_true",
+        help="Split messages inside multibyte characters",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(args))
+
+
+async def run(args):
+    session = load_session(args.session) if args.session else None
+    devices = []
+    for i in range(args.count):
+        if args.loopback:
+            host, port = str(ipaddress.ip_address("127.0.0.2") + i), args.port
+        else:
+            host, port = args.host, args.port + i
+        device = FakeMuso(
+            host,
+            port,
+            session=session,
+            speed=args.speed,
+            chunk_size=args.chunk_size,
+            split_multibyte=args.split_multibyte,
+        )
+        await device.start()
+        devices.append(device)
+    _LOG.info(f"Running {len(devices)} fake Mu-so devices")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await asyncio.gather(*(device.stop() for device in devices))
+
+
+if __name__ == "__main__":
+    main()
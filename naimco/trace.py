@@ -0,0 +1,56 @@
+import logging
+import time
+from collections import deque
+
+_LOG = logging.getLogger(__name__)
+
+#: Direction markers in the dump
+SENT = ">>"
+RECEIVED = "<<"
+NVM_SENT = "NVM>>"
+NVM_RECEIVED = "NVM<<"
+
+
+class WireTrace:
+    """Ring buffer with the last messages to and from a device
+
+    Recording is cheap, the data is kept as it is and only formatted when
+    the trace is dumped, so it can stay on in production and be dumped when
+    something goes wrong instead of logging all traffic at DEBUG level.
+    """
+
+    def __init__(self, size=256):
+        """Create a trace
+
+        Parameters
+        ----------
+        size : int
+            Number of messages kept, older ones are dropped.
+        """
+        self.records = deque(maxlen=size)
+
+    def record(self, direction, data):
+        """Add a message, `data` is bytes or str"""
+        self.records.append((time.time(), direction, data))
+
+    def clear(self):
+        self.records.clear()
+
+    def lines(self):
+        """The recorded messages formatted one per line, oldest first"""
+        lines = []
+        for timestamp, direction, data in self.records:
+            if isinstance(data, bytes):
+                data = data.decode("utf-8", "backslashreplace")
+            clock = time.strftime("%H:%M:%S", time.localtime(timestamp))
+            millis = int(timestamp % 1 * 1000)
+            lines.append(f"{clock}.{millis:03d} {direction:<5} {data!r}")
+        return lines
+
+    def dump(self) -> str:
+        return "\n".join(self.lines())
+
+    def log(self, logger=_LOG, level=logging.INFO):
+        """Write the recorded messages to a logger"""
+        for line in self.lines():
+            logger.log(level, "%s", line)
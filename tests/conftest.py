@@ -0,0 +1,45 @@
+import asyncio
+import contextlib
+
+from naimco import NaimCo
+from naimco.fake_device import FakeMuso
+
+
+async def wait_for(condition, timeout=2):
+    """Wait until `condition()` is true, TimeoutError after `timeout` seconds"""
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+@contextlib.asynccontextmanager
+async def running_device(ready=None, fake=None, **options):
+    """A NaimCo started against a FakeMuso, shut down on exit
+
+    Parameters
+    ----------
+    ready : callable
+        Called with the NaimCo, the device is yielded once it returns true.
+        Defaults to waiting for the room name.
+    fake : dict
+        Keyword arguments of the FakeMuso.
+    **options
+        Keyword arguments of the NaimCo.
+
+    Yields
+    ------
+    tuple[FakeMuso, NaimCo]
+    """
+    if ready is None:
+
+        def ready(device):
+            return device.roomname is not None
+
+    async with FakeMuso(port=0, **(fake or {})) as muso:
+        device = NaimCo("127.0.0.1", port=muso.port, **options)
+        await device.startup()
+        try:
+            await wait_for(lambda: ready(device))
+            yield muso, device
+        finally:
+            await device.shutdown()
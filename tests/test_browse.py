@@ -0,0 +1,56 @@
+import asyncio
+
+from naimco.browse import RowCache
+
+from .conftest import running_device, wait_for
+
+
+def fetching_rows():
+    """Tasks still fetching a window of rows"""
+    return [
+        task
+        for task in asyncio.all_tasks()
+        if task.get_coro().__qualname__ == "Controller.get_rows"
+    ]
+
+
+def test_row_cache_evicts_least_recently_used():
+    cache = RowCache(max_rows=4)
+    cache.put(65, 1, 2, ["a", "b"])
+    cache.put(65, 3, 4, ["c", "d"])
+    assert cache.get(65, 1, 2) == ["a", "b"]
+    cache.put(66, 1, 2, ["x", "y"])
+    assert cache.get(65, 3, 4) is None
+    assert cache.get(65, 1, 2) == ["a", "b"]
+    assert cache.rows == 4
+    cache.invalidate(65)
+    assert cache.get(65, 1, 2) is None
+    assert len(cache) == 1 and cache.rows == 2
+
+
+def test_browse_pages_through_rows():
+    async def run():
+        async with running_device(fake={"rows": 120}) as (fake, device):
+            rows = [row async for row in device.browse(page_size=50)]
+            assert [row["index"] for row in rows] == list(range(1, 121))
+            assert fake.commands.count("GetRows") == 3
+            # the windows are cached, browsing again sends no GetRows
+            rows = [row async for row in device.browse(page_size=50)]
+            assert len(rows) == 120
+            assert fake.commands.count("GetRows") == 3
+
+    asyncio.run(run())
+
+
+def test_browse_stopped_early_leaves_no_fetch_running():
+    async def run():
+        async with running_device(fake={"rows": 120}) as (_, device):
+            async for row in device.browse(start=101, page_size=5):
+                assert row["index"] == 101
+                break
+            # the window fetched ahead is cancelled and its reply dropped
+            await wait_for(lambda: not fetching_rows())
+            await wait_for(lambda: not device.controller.pending_replies)
+            assert device.controller.row_cache.get(65, 106, 110) is None
+
+    asyncio.run(run())
@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+from naimco import NaimCo
+from naimco.cache import StateCache, static_data
+from naimco.records import InputEntry, PresetEntry
+
+from .conftest import running_device
+
+
+def make_state(device):
+    state = device.state
+    state.serialnum = "1107010284"
+    state.product = "MUSO"
+    state.roomname = "Livingroom"
+    state.set_inputblk_entry(1, InputEntry("IRADIO", "iRadio"))
+    state.set_presetblk_entry(2, PresetEntry("USED", "Rás 2", "INTERNET"))
+    state.set_bridge_co_app_versions({"version": "1.2"})
+    return state
+
+
+def test_cache_round_trip(tmp_path):
+    path = tmp_path / "naimco.json"
+    cache = StateCache(path)
+    assert cache.load("10.0.0.1") is None
+    entry = static_data(make_state(NaimCo("10.0.0.1")))
+    cache.store("10.0.0.1", entry)
+    assert cache.load("10.0.0.1") == entry
+    assert json.loads(path.read_text(encoding="utf-8"))["version"] == 1
+    cache.store("10.0.0.1", None)
+    assert cache.load("10.0.0.1") is None
+
+
+def test_concurrent_stores_keep_every_device(tmp_path):
+    async def run():
+        path = tmp_path / "naimco.json"
+        entry = static_data(make_state(NaimCo("10.0.0.1")))
+        ips = [f"10.0.0.{i}" for i in range(1, 21)]
+        await asyncio.gather(
+            *(asyncio.to_thread(StateCache(path).store, ip, entry) for ip in ips)
+        )
+        assert all(StateCache(path).load(ip) == entry for ip in ips)
+
+    asyncio.run(run())
+
+
+def test_startup_state_from_cache(tmp_path):
+    async def run():
+        path = tmp_path / "naimco.json"
+        saved = NaimCo("10.0.0.1", cache_path=path)
+        make_state(saved)
+        await saved.save_cache()
+
+        device = NaimCo("10.0.0.1", cache_path=path)
+        assert await device.load_cache()
+        assert device.roomname == "Livingroom"
+        assert device.inputs == {"IRADIO": "iRadio"}
+        assert device.presets == {2: "Rás 2"}
+        assert device.state.bridge_co_app_versions == {"version": "1.2"}
+        assert not await NaimCo("10.0.0.2", cache_path=path).load_cache()
+
+    asyncio.run(run())
+
+
+def test_warm_start_connects_once(tmp_path):
+    async def run():
+        path = tmp_path / "naimco.json"
+        saved = NaimCo("127.0.0.1", cache_path=path)
+        make_state(saved)
+        await saved.save_cache()
+
+        async with running_device(
+            lambda device: device.reconnect_stats.connected_at is not None,
+            cache_path=path,
+        ) as (fake, device):
+            await asyncio.sleep(0.05)
+            stats = device.reconnect_stats
+            assert (stats.attempts, stats.failures, stats.reconnects) == (1, 0, 0)
+            assert fake.connections == 1
+
+    asyncio.run(run())
+
+
+def test_warm_start_fetches_blocks_once(tmp_path):
+    async def run():
+        path = tmp_path / "naimco.json"
+        saved = NaimCo("127.0.0.1", cache_path=path)
+        make_state(saved)
+        await saved.save_cache()
+
+        async with running_device(
+            lambda device: device._cache_validated, cache_path=path
+        ) as (fake, device):
+            for command in ("GETINPUTBLK", "GETTOTALPRESETS", "GETPRESETBLK 1 3"):
+                assert fake.commands.count(f"*NVM {command}") == 1, command
+            # the revalidated presets replaced the cached ones
+            assert device.presets == {1: "Rás 1 RÚV 93.5 FM", 2: "Rás 2 RÚV 90.1 FM"}
+
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+import asyncio
+
+from naimco.connection import Connection
+
+from .conftest import running_device
+
+
+class FakeWriter:
+    def __init__(self):
+        self.writes = []
+        self.drains = 0
+
+    def writelines(self, messages):
+        self.writes.append(list(messages))
+
+    async def drain(self):
+        self.drains += 1
+
+    def close(self):
+        pass
+
+
+def test_send_coalesces_messages_into_one_write():
+    async def run():
+        writer = FakeWriter()
+        connection = Connection(None, writer)
+        await asyncio.gather(
+            connection.send(b"<a/>"), connection.send("<b/>"), connection.send(b"<c/>")
+        )
+        assert writer.writes == [[b"<a/>", b"<b/>", b"<c/>"]]
+        assert writer.drains == 1
+        assert connection.last_flush_frames == 3
+        assert connection.bytes_sent == 12
+        await connection.send(b"<d/>")
+        assert writer.writes[-1] == [b"<d/>"]
+        assert connection.flushes == 2
+
+    asyncio.run(run())
+
+
+def test_send_flushes_full_batch_and_waits_max_latency():
+    async def run():
+        writer = FakeWriter()
+        connection = Connection(None, writer, max_latency=0.01, max_batch=2)
+        await asyncio.gather(*(connection.write(m) for m in [b"1", b"2", b"3"]))
+        assert writer.writes == [[b"1", b"2"], [b"3"]]
+
+    asyncio.run(run())
+
+
+def test_naimco_passes_batching_to_connection():
+    async def run():
+        options = {"send_max_latency": 0.005, "send_max_batch": 3}
+        async with running_device(**options) as (_, device):
+            connection = device.controller.connection
+            assert (connection.max_latency, connection.max_batch) == (0.005, 3)
+
+    asyncio.run(run())
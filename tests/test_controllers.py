@@ -0,0 +1,368 @@
+import base64
+import asyncio
+
+import pytest
+
+from naimco import NaimCo
+from naimco.controllers import Controller, NVMController, NVMError
+from naimco.scheduler import PRIORITY_BACKGROUND, PRIORITY_USER
+
+
+class FakeConnection:
+    def __init__(self):
+        self.sent = []
+        self.aborted = False
+
+    def write(self, message):
+        self.sent.append(message)
+        waiter = asyncio.get_running_loop().create_future()
+        waiter.set_result(None)
+        return waiter
+
+    def abort(self):
+        self.aborted = True
+
+    async def close(self):
+        pass
+
+
+def base64_nvm(message):
+    encoded = message.decode().split("<base64>")[1].split("</base64>")[0]
+    return base64.b64decode(encoded).decode().strip()
+
+
+def make_controller():
+    controller = Controller(NaimCo("127.0.0.1"))
+    controller.connection = FakeConnection()
+    return controller
+
+
+def test_reply_resolves_command_future():
+    async def run():
+        controller = make_controller()
+        first = await controller.send_command("GetNowPlaying")
+        second = await controller.send_command("GetViewState")
+        # replies can arrive in any order
+        controller.process("reply", {"id": "2", "GetViewState": {"state": "play"}})
+        controller.process(
+            "error",
+            {
+                "id": "1",
+                "code": "1",
+                "description": "Not playing",
+                "GetNowPlaying": None,
+            },
+        )
+        assert await second == {"id": "2", "GetViewState": {"state": "play"}}
+        assert (await first)["description"] == "Not playing"
+        assert controller.pending_replies == {}
+
+    asyncio.run(run())
+
+
+def test_request_times_out():
+    async def run():
+        controller = make_controller()
+        controller.REPLY_TIMEOUT = 0.01
+        with pytest.raises(asyncio.TimeoutError):
+            await controller.request("Ping")
+        assert controller.pending_replies == {}
+
+    asyncio.run(run())
+
+
+def test_unanswered_pings_drop_connection():
+    async def run():
+        controller = make_controller()
+        controller.PING_TIMEOUT = 0.01
+        ping = asyncio.create_task(controller.ping())
+        await asyncio.sleep(0)
+        controller.process("reply", {"id": "1", "Ping": None})
+        assert await ping == controller.ping_rtt
+        assert await controller.ping() is None
+        assert controller.missed_pings == 1
+        with pytest.raises(ConnectionAbortedError):
+            await controller.ping()
+        assert controller.connection.aborted
+
+    asyncio.run(run())
+
+
+def nvm_event(line):
+    return "\r\n".join(line.splitlines()) + "\r\n"
+
+
+def test_nvm_request_resolves_with_reply_tokens():
+    async def run():
+        controller = make_controller()
+        getvol = await controller.nvm.send_command("GETVOL")
+        preamp = await controller.nvm.send_command("GETPREAMP")
+        controller.nvm.assemble_msgs(
+            nvm_event(
+                '#NVM GETVOL 7\n#NVM PREAMP 7 0 0 IRADIO OFF OFF OFF OFF "iRadio" OFF'
+            )
+        )
+        assert await getvol == ["7"]
+        assert (await preamp)[3] == "IRADIO"
+        assert controller.naimco.state.input == "IRADIO"
+
+    asyncio.run(run())
+
+
+def test_nvm_multi_line_reply():
+    async def run():
+        controller = make_controller()
+        inputs = await controller.nvm.send_command("GETINPUTBLK")
+        controller.nvm.assemble_msgs(
+            nvm_event(
+                '#NVM GETINPUTBLK 1 2 1 IRADIO "iRadio"\n'
+                '#NVM GETINPUTBLK 2 2 1 UPNP "UPnP"'
+            )
+        )
+        assert await inputs == [
+            ["1", "2", "1", "IRADIO", "iRadio"],
+            ["2", "2", "1", "UPNP", "UPnP"],
+        ]
+        presets = await controller.nvm.send_command("GETPRESETBLK 1 2")
+        controller.nvm.assemble_msgs(
+            nvm_event(
+                '#NVM GETPRESETBLK 1 40 USED "X 97.7" INTERNET 0 NONE NORMAL\n'
+                '#NVM GETPRESETBLK 2 40 FREE "" NONE 0 NONE NORMAL'
+            )
+        )
+        assert len(await presets) == 2
+        assert controller.nvm.pending == []
+
+    asyncio.run(run())
+
+
+def test_nvm_error_reply():
+    async def run():
+        controller = make_controller()
+        with pytest.raises(NVMError):
+            pause = await controller.nvm.send_command("PAUSE")
+            controller.nvm.assemble_msgs(
+                nvm_event("#NVM ERROR: [5] Insufficient Parameters")
+            )
+            await pause
+
+    asyncio.run(run())
+
+
+def test_nvm_error_with_several_requests_in_flight_is_not_attributed():
+    async def run():
+        controller = make_controller()
+        illum = await controller.nvm.send_command("SETILLUM 2")
+        roomname = await controller.nvm.send_command("GETROOMNAME")
+        controller.nvm.assemble_msgs(
+            nvm_event("#NVM ERROR: [11] Command not allowed in current state")
+        )
+        assert not illum.done()
+        assert not roomname.done()
+        controller.nvm.assemble_msgs(nvm_event("#NVM SETILLUM OK"))
+        assert await illum == ["OK"]
+        # with a single request in flight the error is its own
+        controller.nvm.assemble_msgs(
+            nvm_event("#NVM ERROR: [11] Command not allowed in current state")
+        )
+        with pytest.raises(NVMError):
+            await roomname
+
+    asyncio.run(run())
+
+
+def test_request_data_update_pipelines_queries():
+    async def run():
+        controller = make_controller()
+        controller.DATA_UPDATE_TIMEOUT = 0.05
+        update = asyncio.create_task(controller.request_data_update())
+        await asyncio.sleep(0)
+        # all queries written at once before any reply arrives
+        assert len(controller.connection.sent) == 14
+        controller.nvm.assemble_msgs(
+            nvm_event(
+                "#NVM GETSTANDBYSTATUS ON NETWORK\n"
+                "#NVM PRODUCT MUSO\n"
+                '#NVM GETROOMNAME "Livingroom"'
+            )
+        )
+        result = await update
+        assert {"GETSTANDBYSTATUS", "PRODUCT", "GETROOMNAME"} <= set(result.received)
+        assert "GETPSU" in result.timed_out
+        assert controller.naimco.state.roomname == "Livingroom"
+
+    asyncio.run(run())
+
+
+def test_resume_data_update_skips_known_and_background_queries():
+    async def run():
+        controller = make_controller()
+        controller.DATA_UPDATE_TIMEOUT = 0.01
+        state = controller.naimco.state
+        state.product = "MUSO"
+        state.serialnum = "123"
+        state.roomname = "Livingroom"
+        await controller.request_data_update(full=False)
+        sent = [base64_nvm(m) for m in controller.connection.sent if b"base64" in m]
+        assert sent == [
+            "*NVM GETVIEWSTATE",
+            "*NVM GETPREAMP",
+            "*NVM GETBRIEFNP",
+            "*NVM GETSTANDBYSTATUS",
+            "*NVM GETINPUTBLK",
+            "*NVM GETTOTALPRESETS",
+        ]
+
+    asyncio.run(run())
+
+
+def test_malformed_nvm_line_fails_its_request():
+    async def run():
+        controller = make_controller()
+        total = await controller.nvm.send_command("GETTOTALPRESETS")
+        room = await controller.nvm.send_command("GETROOMNAME")
+        controller.nvm.assemble_msgs(
+            nvm_event('#NVM GETTOTALPRESETS many\n#NVM GETROOMNAME "Livingroom"')
+        )
+        with pytest.raises(ValueError):
+            await total
+        assert await room == ["Livingroom"]
+        assert controller.nvm.pending == []
+
+    asyncio.run(run())
+
+
+def test_nvm_state_records():
+    async def run():
+        controller = make_controller()
+        controller.nvm.assemble_msgs(
+            nvm_event(
+                '#NVM PREAMP 7 0 0 IRADIO ON OFF OFF OFF "iRadio" OFF\n'
+                '#NVM GETVIEWSTATE PLAYING CONNECTING 2 N N NA IRADIO "R2" "Rás 2" NA NA\n'
+                "#NVM GETSTANDBYSTATUS ON NETWORK"
+            )
+        )
+        state = controller.naimco.state
+        assert state.volume == 7
+        assert state.mute is True
+        assert state.preamp.input_label == "iRadio"
+        assert state.viewstate.preset == 2
+        assert state.viewstate["compact_name"] == "R2"
+        assert state.standbystatus.get("type") == "NETWORK"
+
+    asyncio.run(run())
+
+
+def test_add_nvm_handler():
+    async def run():
+        controller = make_controller()
+        received = []
+        NVMController.add_handler(
+            "GETBTNAME", lambda nvm, tokens: received.append(tokens)
+        )
+        try:
+            controller.nvm.assemble_msgs(nvm_event('#NVM GETBTNAME "Stofan"'))
+        finally:
+            del NVMController.handlers["GETBTNAME"]
+        assert received == [["Stofan"]]
+
+    asyncio.run(run())
+
+
+def test_handler_registry():
+    assert Controller.handlers["GetNowPlayingTime"] is Controller._GetNowPlayingTime
+    assert NVMController.handlers["VOL+"] is NVMController._VOLplus
+    assert NVMController.handlers["ERROR:"] is NVMController._ERROR_
+
+
+def test_scheduler_supersedes_and_prioritizes_when_throttled():
+    async def run():
+        controller = make_controller()
+        controller.scheduler.tokens = 0
+        controller.scheduler.rate = 1000
+        sent = controller.connection.sent
+        temp = controller.nvm.submit("GETTEMP")
+        volumes = [controller.nvm.submit(f"SETRVOL {v}") for v in range(10, 15)]
+        assert controller.scheduler.depth == 2
+        assert controller.scheduler.depth_by_priority() == {
+            PRIORITY_USER: 1,
+            PRIORITY_BACKGROUND: 1,
+        }
+        assert controller.scheduler.superseded == 4
+        await asyncio.gather(temp.sent, volumes[0].sent)
+        # only the newest volume is sent, before the background poll
+        assert [base64_nvm(message) for message in sent] == [
+            "*NVM SETRVOL 14",
+            "*NVM GETTEMP",
+        ]
+        assert all(queued is volumes[0] for queued in volumes)
+
+    asyncio.run(run())
+
+
+def test_fetch_blocks_applies_only_changes():
+    async def run():
+        controller = make_controller()
+        state = controller.naimco.state
+        inputs = (
+            '#NVM GETINPUTBLK 1 2 1 IRADIO "iRadio"\n#NVM GETINPUTBLK 2 2 1 UPNP "UPnP"'
+        )
+
+        async def fetch(presets):
+            fetch = controller.nvm.fetch_blocks()
+            await asyncio.sleep(0)
+            controller.nvm.assemble_msgs(nvm_event(f"{inputs}\n#NVM GETTOTALPRESETS 2"))
+            while not any(
+                request.command.startswith("GETPRESETBLK")
+                for request in controller.nvm.pending
+            ):
+                await asyncio.sleep(0)
+            controller.nvm.assemble_msgs(nvm_event(presets))
+            return await fetch
+
+        first = (
+            '#NVM GETPRESETBLK 1 2 USED "Rás 1" INTERNET 0 NONE NORMAL\n'
+            '#NVM GETPRESETBLK 2 2 USED "Rás 2" INTERNET 0 NONE NORMAL'
+        )
+        assert await fetch(first) == ["inputblk", "presetblk"]
+        scn = state.scn
+        # nothing changed, no new state for the callback
+        assert await fetch(first) == []
+        assert state.scn == scn
+        renamed = (
+            '#NVM GETPRESETBLK 1 2 USED "Rás 1 FM" INTERNET 0 NONE NORMAL\n'
+            '#NVM GETPRESETBLK 2 2 FREE "" NONE 0 NONE NORMAL'
+        )
+        assert await fetch(renamed) == ["presetblk"]
+        assert state.changes_since(scn).keys() == {"presetblk"}
+        assert controller.naimco.presets == {1: "Rás 1 FM"}
+
+    asyncio.run(run())
+
+
+def test_volume_slider_drag_sends_few_commands():
+    async def run():
+        controller = make_controller()
+        for volume in range(30, 60):
+            controller.nvm.submit(f"SETRVOL {volume}")
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(controller.scheduler.hold)
+        sent = [base64_nvm(message) for message in controller.connection.sent]
+        # the first step at once, then only the latest
+        assert sent == ["*NVM SETRVOL 30", "*NVM SETRVOL 59"]
+        assert controller.scheduler.depth == 0
+
+    asyncio.run(run())
+
+
+def test_data_update_xml_commands_have_no_payload():
+    async def run():
+        controller = make_controller()
+        controller.DATA_UPDATE_TIMEOUT = 0.01
+        await controller.request_data_update(full=False)
+        xml = [m for m in controller.connection.sent if b"base64" not in m]
+        assert xml[0] == b"<command><name>GetViewState</name><id>1</id></command>"
+        assert xml[-1].startswith(b"<command><name>GetNowPlaying</name><id>")
+        assert not any(b"<map>" in message for message in xml)
+
+    asyncio.run(run())
@@ -0,0 +1,168 @@
+import asyncio
+import socket
+import time
+
+import pytest
+
+from naimco import NaimCo, NaimFleet, NaimState
+from naimco.records import ViewState
+
+from .conftest import running_device, wait_for
+
+
+def test_callback_coalesces_burst_of_changes():
+    async def run():
+        calls = []
+
+        async def callback(state, changed):
+            calls.append((state.volume, changed))
+
+        device = NaimCo(
+            "127.0.0.1", callback=callback, coalesce_window=0.02, notify_changes=True
+        )
+        for volume in range(5):
+            device.state.volume = volume
+            await device._call_callback()
+        device.state.mute = True
+        await device._call_callback()
+        assert calls == []
+        await asyncio.sleep(0.05)
+        assert calls == [(4, frozenset({"volume", "mute"}))]
+
+    asyncio.run(run())
+
+
+def test_callback_without_window_is_immediate():
+    async def run():
+        calls = []
+
+        async def callback(state):
+            calls.append(state.volume)
+
+        device = NaimCo("127.0.0.1", callback=callback)
+        device.state.volume = 3
+        await device._call_callback()
+        await device._call_callback()
+        assert calls == [3]
+
+    asyncio.run(run())
+
+
+def test_changes_since():
+    state = NaimState()
+    state.volume = 10
+    start = state.scn
+    state.set_now_playing({"title": "Song"})
+    state.set_now_playing_time(1)
+    state.set_now_playing_time(2)
+    state.volume = 10  # unchanged
+    changes = state.changes_since(start)
+    assert changes.keys() == {"now_playing", "media_position"}
+    assert changes["now_playing"] == {"title": "Song"}
+    assert state.field_scn("now_playing") < state.field_scn("media_position")
+    assert state.changes_since(state.scn) == {}
+    assert state.field_scn("illum") == 0
+    # without a field only the global scn moves
+    scn = state.scn
+    state.inc_scn()
+    assert state.scn == scn + 1
+    assert state.changes_since(scn) == {}
+
+
+def test_media_position_only_changes_on_discontinuities(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    state = NaimState()
+    state.set_now_playing_time(10)
+    scn = state.scn
+    for second in range(11, 70):
+        clock[0] += 1
+        state.set_now_playing_time(second)
+    # steady ticks move the position without a change
+    assert state.scn == scn
+    assert state.media_position == 69
+    clock[0] += 0.5
+    assert state.media_position == 69.5
+    # a seek moves the anchor
+    clock[0] += 0.5
+    state.set_now_playing_time(200)
+    assert state.scn == scn + 1
+    assert state.position_anchor.position == 200
+    # pausing freezes the position
+    state.viewstate = ViewState("PAUSED", "NA", 0, "UPNP", "", "")
+    clock[0] += 5
+    assert state.media_position == 200
+    assert state.changes_since(scn + 1).keys() == {"viewstate", "media_position"}
+
+
+def test_tick_while_paused_keeps_position(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: clock[0])
+    state = NaimState()
+    state.set_now_playing_time(15)
+    clock[0] += 0.4
+    state.viewstate = ViewState("PAUSED", "NA", 0, "UPNP", "", "")
+    assert state.media_position == pytest.approx(15.4)
+    scn = state.scn
+    state.set_now_playing_time(15)
+    clock[0] += 30
+    assert state.media_position == pytest.approx(15.4)
+    assert not state.position_anchor.playing
+    assert state.scn == scn
+    # a seek while paused moves the position but it stays paused
+    state.set_now_playing_time(60)
+    clock[0] += 5
+    assert state.media_position == 60
+    state.viewstate = ViewState("PLAYING", "NA", 0, "UPNP", "", "")
+    clock[0] += 5
+    assert state.media_position == 65
+
+
+def test_reconnect_backoff_is_immediate_then_exponential():
+    device = NaimCo("127.0.0.1")
+    assert device.reconnect_backoff(1) == 0
+    for retries, backoff in [(2, 1), (3, 2), (5, 8), (20, 120)]:
+        assert backoff / 2 <= device.reconnect_backoff(retries) <= backoff
+
+
+def test_reconnect_backoff_jitters_the_first_retry():
+    device = NaimFleet(reconnect_jitter=5).add("127.0.0.1")
+    waits = [device.reconnect_backoff(1) for _ in range(20)]
+    assert all(0 <= wait <= 5 for wait in waits)
+    assert len(set(waits)) > 1
+
+
+def test_failed_initialize_closes_the_connection(monkeypatch):
+    initialize = NaimCo.initialize
+    failed = []
+
+    async def fail_once(device, *args, **kwargs):
+        if not failed:
+            failed.append(device.controller.connection)
+            raise ConnectionError("initialize failed")
+        await initialize(device, *args, **kwargs)
+
+    monkeypatch.setattr(NaimCo, "initialize", fail_once)
+
+    async def run():
+        async with running_device() as (fake, _):
+            assert fake.connections == 2
+        assert failed[0].writer.is_closing()
+
+    asyncio.run(run())
+
+
+def test_shutdown_of_unreachable_device(tmp_path):
+    async def run():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        path = tmp_path / "naimco.json"
+        device = NaimCo("127.0.0.1", port=port, cache_path=path)
+        device.state.serialnum = "1107010284"
+        await device.startup()
+        await wait_for(lambda: device.reconnect_stats.failures > 0)
+        await device.shutdown()
+        assert path.exists()
+
+    asyncio.run(run())
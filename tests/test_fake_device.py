@@ -0,0 +1,56 @@
+import asyncio
+
+from naimco import NaimCo
+from naimco.fake_device import FakeMuso, RecordingProxy, load_session
+
+from .conftest import running_device, wait_for
+
+
+def test_naimco_against_fake_device_with_split_packets():
+    async def run():
+        async with running_device(
+            lambda device: len(device.presets) == 2 and device.volume == 7,
+            fake={"chunk_size": 7, "split_multibyte": True},
+        ) as (fake, device):
+            assert device.roomname == "Livingroom"
+            assert device.inputs["SPOTIFY"] == "Spotify"
+            assert device.media_title == "Morgunútvarpið"
+            await device.set_volume(12)
+            await wait_for(lambda: device.volume == 12)
+            assert "*NVM SETRVOL 12" in fake.commands
+
+    asyncio.run(run())
+
+
+def test_naimco_reconnects_after_disconnect():
+    async def run():
+        async with running_device(
+            lambda device: device.reconnect_stats.reconnects == 1,
+            fake={"disconnect_after": 5},
+        ) as (fake, device):
+            assert fake.connections == 2
+
+    asyncio.run(run())
+
+
+def test_record_and_replay_session(tmp_path):
+    async def run():
+        path = tmp_path / "session.jsonl"
+        async with FakeMuso(port=0) as fake:
+            async with RecordingProxy(
+                "127.0.0.1", path, port=0, device_port=fake.port
+            ) as proxy:
+                device = NaimCo("127.0.0.1", port=proxy.port)
+                await device.startup()
+                await wait_for(lambda: device.roomname == "Livingroom")
+                await device.shutdown()
+        session = load_session(path)
+        assert {sender for _, sender, _ in session} == {"client", "device"}
+
+        async with running_device(
+            lambda device: device.roomname == "Livingroom",
+            fake={"session": session, "speed": 100, "answer_commands": False},
+        ) as (replay, device):
+            assert replay.commands == []
+
+    asyncio.run(run())
@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+from naimco import NaimFleet
+
+
+class FakeController:
+    def __init__(self, last_send_time):
+        self.last_send_time = last_send_time
+        self.last_receive_time = None
+        self.sent = []
+
+    async def ping(self):
+        self.sent.append("Ping")
+
+
+class HangingController(FakeController):
+    async def ping(self):
+        self.sent.append("Ping")
+        await asyncio.Event().wait()
+
+
+def test_ping_due_pings_only_idle_devices():
+    async def run():
+        fleet = NaimFleet(heartbeat_timeout=10)
+        idle = fleet.add("10.0.0.1")
+        busy = fleet.add("10.0.0.2")
+        offline = fleet.add("10.0.0.3")
+        now = time.monotonic() + 10
+        idle.controller = FakeController(last_send_time=now - 10)
+        busy.controller = FakeController(last_send_time=now - 5)
+        next_deadline = fleet.ping_due(now)
+        await asyncio.sleep(0)
+        assert idle.controller.sent == ["Ping"]
+        assert busy.controller.sent == []
+        # busy device is due 9 s after its last send
+        assert next_deadline == now + 4
+        assert offline.controller is None
+        assert len(fleet._deadlines) == 3
+
+    asyncio.run(run())
+
+
+def test_hanging_ping_does_not_hold_up_other_devices():
+    async def run():
+        fleet = NaimFleet(heartbeat_timeout=10)
+        hanging = fleet.add("10.0.0.1")
+        other = fleet.add("10.0.0.2")
+        now = time.monotonic() + 10
+        hanging.controller = HangingController(last_send_time=now - 10)
+        other.controller = FakeController(last_send_time=now - 5)
+        next_deadline = fleet.ping_due(now)
+        await asyncio.sleep(0)
+        assert hanging.controller.sent == ["Ping"]
+        # the other device is pinged on time while the first ping hangs
+        assert fleet.ping_due(next_deadline) == now + 9
+        await asyncio.sleep(0)
+        assert other.controller.sent == ["Ping"]
+        # no second ping while the first one is still waiting
+        fleet.ping_due(now + 9)
+        await asyncio.sleep(0)
+        assert hanging.controller.sent == ["Ping"]
+        await fleet.shutdown()
+
+    asyncio.run(run())
+
+
+def test_fleet_callback_gets_device():
+    async def run():
+        calls = []
+
+        async def callback(device, state):
+            calls.append((device.ip_address, state.volume))
+
+        fleet = NaimFleet(callback=callback)
+        device = fleet.add("10.0.0.1")
+        device.state.volume = 5
+        await device._call_callback()
+        assert calls == [("10.0.0.1", 5)]
+
+    asyncio.run(run())
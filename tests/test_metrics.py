@@ -0,0 +1,36 @@
+import asyncio
+
+from naimco import NaimCo
+from naimco.metrics import Histogram, prometheus_text
+
+from .conftest import running_device, wait_for
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value)
+    assert histogram.snapshot() == {
+        "buckets": [(0.1, 1), (1.0, 3), (float("inf"), 4)],
+        "count": 4,
+        "sum": 4.25,
+    }
+
+
+def test_metrics_of_session_with_fake_device():
+    async def run():
+        async with running_device(metrics=True) as (_, device):
+            await wait_for(lambda: "NVM GETROOMNAME" in device.metrics.reply_latency)
+        snapshot = device.metrics.snapshot()
+        assert snapshot["bytes_in"] > 0 and snapshot["bytes_out"] > 0
+        assert snapshot["nvm_lines"] > 10
+        assert snapshot["handlers"]["NVM GETROOMNAME"]["calls"] == 1
+        text = prometheus_text({"10.0.0.1": snapshot})
+        assert 'naimco_received_bytes_total{device="10.0.0.1"}' in text
+        assert (
+            'naimco_reply_latency_seconds_bucket{device="10.0.0.1",'
+            'command="NVM GETROOMNAME",le="+Inf"} 1'
+        ) in text
+        assert NaimCo("127.0.0.1").metrics.snapshot() == {}
+
+    asyncio.run(run())
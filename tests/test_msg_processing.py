@@ -0,0 +1,177 @@
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from naimco.msg_processing import (
+    MessageFramer,
+    MessageStreamProcessor,
+    dict_to_etree,
+    gen_xml_command,
+    tokenize_nvm,
+)
+
+NOW_PLAYING = (
+    '<event name="GetNowPlaying"><map>'
+    '<item name="title" string="Rás 2 RÚV 90.1 FM" />'
+    '<item name="source" string="iradio" />'
+    "</map></event>"
+).encode("utf-8")
+
+REPLY = b'<reply name="SetHeartbeatTimeout" id="2">\n</reply>'
+ERROR = (
+    b"<error><name>GetNowPlaying</name><id>12</id><code>1</code>"
+    b"<description>Not playing</description></error>"
+)
+
+
+def test_framer_splits_concatenated_elements():
+    framer = MessageFramer()
+    framer.feed(REPLY + b"\n" + ERROR + b"\n")
+    assert framer.frames() == [REPLY, ERROR]
+    assert framer.buffer == b""
+
+
+def test_framer_keeps_incomplete_element():
+    framer = MessageFramer()
+    framer.feed(REPLY + ERROR[:20])
+    assert framer.frames() == [REPLY]
+    framer.feed(ERROR[20:])
+    assert framer.frames() == [ERROR]
+
+
+def test_framer_self_closing_and_quoted_gt():
+    frame = b'<reply name="a>b" id="3"/>'
+    framer = MessageFramer()
+    framer.feed(frame + REPLY)
+    assert framer.frames() == [frame, REPLY]
+
+
+def test_stream_processor_multibyte_split():
+    processor = MessageStreamProcessor()
+    # split inside the two byte encoding of 'á'
+    split = NOW_PLAYING.index("á".encode("utf-8")) + 1
+    processor.feed(NOW_PLAYING[:split])
+    assert list(processor.read_messages()) == []
+    processor.feed(NOW_PLAYING[split:] + REPLY)
+    messages = list(processor.read_messages())
+    assert messages == [
+        (
+            "event",
+            {"GetNowPlaying": {"title": "Rás 2 RÚV 90.1 FM", "source": "iradio"}},
+        ),
+        ("reply", {"id": "2", "SetHeartbeatTimeout": None}),
+    ]
+
+
+def test_stream_processor_byte_at_a_time():
+    processor = MessageStreamProcessor()
+    for i in range(len(ERROR)):
+        processor.feed(ERROR[i : i + 1])
+    assert list(processor.read_messages()) == [
+        (
+            "error",
+            {
+                "id": "12",
+                "code": "1",
+                "description": "Not playing",
+                "GetNowPlaying": None,
+            },
+        )
+    ]
+
+
+def test_stream_processor_memory_stays_flat():
+    processor = MessageStreamProcessor()
+    event = b'<event name="GetNowPlayingTime"><map><item name="play_time" int="1" /></map></event>'
+
+    def play(count):
+        for _ in range(count):
+            processor.feed(event)
+            list(processor.read_messages())
+
+    processor.feed(event)
+    assert processor.pending_messages == 1
+    play(1000)
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        play(5000)
+        grown = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    # a retained element per message would be hundreds of kilobytes
+    assert grown < 10_000
+    assert processor.pending_messages == 0
+    assert processor.buffered_bytes == 0
+
+
+def test_framer_discards_oversized_incomplete_frame():
+    framer = MessageFramer(max_frame_size=100)
+    framer.feed(b"<event>" + b"x" * 200)
+    assert framer.frames() == []
+    assert framer.buffer == b""
+    assert framer.resets == 1
+    framer.feed(REPLY)
+    assert framer.frames() == [REPLY]
+
+
+def _etree_command(command, id, map=None):
+    cmd = ET.Element("command")
+    ET.SubElement(cmd, "name").text = command
+    ET.SubElement(cmd, "id").text = id
+    if map:
+        cmd.append(dict_to_etree({"map": map}))
+    return ET.tostring(cmd)
+
+
+def test_gen_xml_command_matches_etree():
+    commands = [
+        ("Ping", "1", None),
+        (
+            "TunnelToHost",
+            "2",
+            [{"item": {"name": "data", "base64": "Kk5WTSBQUk9EVUNUDQ==\n"}}],
+        ),
+        (
+            "RequestAPIVersion",
+            "3",
+            [
+                {"item": {"name": "module", "string": "NAIM"}},
+                {"item": {"name": "version", "string": "1"}},
+            ],
+        ),
+        (
+            "PlaySingleURI",
+            "4",
+            {"item": {"name": "URI", "string": "http://a?b=1&c=<%s>"}},
+        ),
+        ("SetHeartbeatTimeout", "5", [{"item": {"name": "timeout", "int": 0}}]),
+        ("SetRoomName", "6", [{"item": {"name": "name", "string": "Stofa Ú"}}]),
+    ]
+    for command in commands:
+        assert gen_xml_command(*command) == _etree_command(*command)
+    # same shape, different values, served from the template cache
+    assert gen_xml_command("TunnelToHost", "7", commands[1][2]) == _etree_command(
+        "TunnelToHost", "7", commands[1][2]
+    )
+
+
+def test_tokenize_nvm():
+    assert tokenize_nvm('#NVM GETPRESETBLK 6 40 FREE "" NONE 0 NONE NORMAL') == [
+        "#NVM",
+        "GETPRESETBLK",
+        "6",
+        "40",
+        "FREE",
+        "",
+        "NONE",
+        "0",
+        "NONE",
+        "NORMAL",
+    ]
+    assert tokenize_nvm("#NVM I'm a Muso") == ["#NVM", "I'm", "a", "Muso"]
+    # unbalanced quote runs to the end of the line
+    assert tokenize_nvm('#NVM GETROOMNAME "Living room') == [
+        "#NVM",
+        "GETROOMNAME",
+        "Living room",
+    ]
@@ -0,0 +1,27 @@
+import asyncio
+
+from naimco.trace import WireTrace
+
+from .conftest import running_device
+
+
+def test_trace_keeps_last_messages():
+    trace = WireTrace(size=2)
+    for i in range(3):
+        trace.record(">>", f"message {i}".encode())
+    lines = trace.lines()
+    assert len(lines) == 2
+    assert lines[0].endswith(">>    'message 1'")
+
+
+def test_wire_trace_of_device():
+    async def run():
+        async with running_device(wire_trace=500) as (_, device):
+            pass
+        dump = device.wire_trace.dump()
+        assert "NVM>> 'GETROOMNAME'" in dump
+        assert "NVM<< '#NVM GETROOMNAME \"Livingroom\"'" in dump
+        assert "<< b'<reply" not in dump
+        assert '<reply name="RequestAPIVersion"' in dump
+
+    asyncio.run(run())